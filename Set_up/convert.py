@@ -1,13 +1,54 @@
 import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from moviepy.editor import VideoFileClip
 
 
-def convert_avi_to_mp4(avi_file):
+def copy_to_mp4(video_file, mp4_file):
     """
-    Converts an AVI video file to MP4 format using moviepy.
+    Copies the video stream of a file into an MP4 container with ffmpeg, without re-encoding it.
+
+    Parameters:
+        video_file (str): Path to the input video file.
+        mp4_file (str): Path to the MP4 file to write.
+
+    Returns:
+        bool: Whether the stream could be copied. It cannot when ffmpeg is not
+        installed or when the codec of the video is not allowed in MP4.
+    """
+    command = [
+        "ffmpeg",
+        "-loglevel",
+        "error",
+        "-y",
+        "-i",
+        video_file,
+        "-map",
+        "0:v:0",
+        "-c:v",
+        "copy",
+        mp4_file,
+    ]
+    try:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        if os.path.exists(mp4_file):
+            os.remove(mp4_file)
+        return False
+    return True
+
+
+def convert_avi_to_mp4(avi_file, stream_copy=True):
+    """
+    Converts an AVI video file to MP4 format.
+
+    The video stream is copied as is when possible (see :func:`copy_to_mp4`),
+    and re-encoded to H.264 with moviepy otherwise. The videos do not need to
+    be converted to be read by mactrack, AVI files are read directly.
 
     Parameters:
         avi_file (str): Path to the input AVI file.
+        stream_copy (bool): Whether to try copying the stream before re-encoding.
 
     Returns:
         str: Path to the generated MP4 file.
@@ -15,20 +56,41 @@ def convert_avi_to_mp4(avi_file):
     if not avi_file.lower().endswith(".avi"):
         raise ValueError("Input file must be an AVI file.")
 
+    mp4_file = os.path.splitext(avi_file)[0] + ".mp4"
+    if stream_copy and copy_to_mp4(avi_file, mp4_file):
+        return mp4_file
+
     clip = VideoFileClip(avi_file)
     fps = int(clip.fps)
-    mp4_file = avi_file.replace(".avi", ".mp4")
     clip.write_videofile(mp4_file, fps=fps, codec="libx264", audio_codec="aac")
     clip.close()
     return mp4_file
 
 
-def convert_all_avi_in_folder(folder_path):
-    for root, dirs, files in os.walk(folder_path):
-        for file_name in files:
-            if file_name.endswith(".avi"):
-                avi_file_path = os.path.join(root, file_name)
-                convert_avi_to_mp4(avi_file_path)
+def convert_all_avi_in_folder(folder_path, workers=None, stream_copy=True):
+    """
+    Converts every AVI file of a folder and its subfolders to MP4, in parallel.
+
+    Parameters:
+        folder_path (str): Folder to search for AVI files.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        stream_copy (bool): See :func:`convert_avi_to_mp4`.
+
+    Returns:
+        list: Paths to the generated MP4 files.
+    """
+    avi_files = [
+        os.path.join(root, file_name)
+        for root, dirs, files in os.walk(folder_path)
+        for file_name in files
+        if file_name.endswith(".avi")
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(
+                convert_avi_to_mp4, avi_files, [stream_copy] * len(avi_files)
+            )
+        )
 
 
 # Delete avi files in folder and subfolders
@@ -1,39 +1,38 @@
-import subprocess
 import os
+import sys
 import cv2
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from mactrack.video.source import decode_video, video_info
 
-def extract_frames(video_path, output_folder, fps=10):
+
+def extract_frames(
+    video_path, output_folder, fps=10, roi=None, scale=1.0, backend="opencv"
+):
     """
-    Extract frames from an MP4 video and save them as PNG images with a fixed resolution.
-    Ensures uniform frame size by resizing and padding if needed.
+    Extract frames from a video and save them as JPEG images.
+
+    Only the frames needed to reach ``fps`` are converted, the others are
+    skipped while decoding (see :func:`mactrack.video.source.decode_video`).
 
-    :param video_path: Path to the input MP4 video file.
+    :param video_path: Path to the input video file.
     :param output_folder: Path to the folder where frames will be saved.
-    :param fps: Frames per second to extract.
-    :param width: Output frame width.
-    :param height: Output frame height.
+    :param fps: Frames per second to extract, at most the frame rate of the video.
+    :param roi: Optional ``(x, y, width, height)`` crop, in pixels of the video.
+    :param scale: Scale factor applied after cropping.
+    :param backend: "opencv" or "ffmpeg", see ``decode_video``.
     """
-    video = cv2.VideoCapture(video_path)
-
-    # Get width and height
-    width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    _, _, _, video_fps = video_info(video_path)
+    stride = max(1, round(video_fps / fps)) if video_fps > 0 else 1
     # Ensure output folder exists
     os.makedirs(output_folder, exist_ok=True)
 
-    output_pattern = os.path.join(output_folder, "%05d.jpg")
-
-    command = [
-        "ffmpeg",
-        "-i",
-        video_path,  # Input video
-        "-vf",
-        f"fps={fps},scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2",
-        "-q:v",
-        "2",  # Quality setting for PNG
-        output_pattern,  # Output file pattern
-    ]
-
-    subprocess.run(command, check=True)
-    print(f"Frames saved in {output_folder} with resolution {width}x{height}")
+    count = 0
+    for frame in decode_video(video_path, stride, roi, scale, backend):
+        count += 1
+        cv2.imwrite(
+            os.path.join(output_folder, f"{count:05d}.jpg"),
+            frame,
+            [cv2.IMWRITE_JPEG_QUALITY, 95],
+        )
+    print(f"{count} frames saved in {output_folder}")
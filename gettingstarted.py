@@ -3,18 +3,19 @@ from mactrack.locate.list_sep import segmentation
 from mactrack.locate.defuse import defuse, invdefuse
 from mactrack.track.track import track
 from mactrack.video.inputconfig import inputconfig
-from mactrack.video.result import video, result, videocomp
+from mactrack.video.result import result, videocomp
 import os
 from mactrack.analyse.intensity import intensity, intensitymed
 from mactrack.analyse.distance import distance
 from mactrack.analyse.size import size
 from mactrack.analyse.perimeter import perimeter
 from mactrack.analyse.recap import aggregate
+from mactrack.analyse.features import extract_features
 import shutil
+import cv2
 from mactrack.track.filtre import supprimer_petit
 
 from Set_up.count import get_frame_count
-from Set_up.convert import convert_avi_to_mp4
 from Set_up.empty_zip import empty_dataset_testy_zip
 from Set_up.dataset_csv import create_dataset_csv
 
@@ -24,22 +25,10 @@ input_folder = os.path.join(current_dir, "examples", "input_tracking")
 video_path = os.path.join(input_folder, "redchannel.avi")
 video_path_v = os.path.join(input_folder, r"vert", "greenchannel.avi")
 
-# If your video, as it is often the case with microscopic videos, is in `avi` format, you can convert it to `mp4` format.
-if video_path.endswith(".avi"):
-    convert_avi_to_mp4(video_path)
-    video_path = video_path.replace(".avi", ".mp4")
+# The videos are read directly in their `avi` format, as often with microscopic videos, or in any other format read by OpenCV (`mp4`, `mov`, `mkv`, ...), so they do not need to be converted.
 
-############################################
-# Do the same for the green channel video
-if video_path_v.endswith(".avi"):
-    convert_avi_to_mp4(video_path_v)
-    video_path_v = video_path_v.replace(".avi", ".mp4")
+# .. note:: To still convert them to `mp4`, use `convert_all_avi_in_folder(input_folder)` (from `Set_up.convert`). The videos are converted in parallel, and their stream is copied without re-encoding when ffmpeg is installed and the codec allows it.
 
-##############################################
-# .. note:: If you already have a `mp4` video, you can skip this step and put directly the path to the `mp4` video in the `video_path` variable.
-
-
-# Now, your video is a `mp4` file and you can use it in the package.
 n = get_frame_count(video_path)  # Number of frame in the initial video
 p = 10  # Minimal number of frame where you can track your macrophage, if it is present in less or equal p frames, it will not be tracked
 print(n)
@@ -48,6 +37,10 @@ print(n)
 # That is why we recommend to either store the frames you used to build the model in a different folder, or to use a different folder as input, creating a copy of the one used to build the model.
 frame = inputconfig(input_folder)
 
+# .. note:: For long videos, the frames can also be streamed instead of being written to the `dataset` and `vert/frames` folders. Create a `FrameSource(input_folder)` (from `mactrack.video.source`), call `inputconfig(input_folder, write_frames=False)` for the background images and give the source to `locate`, `intensitymed` and `result` through their `source`/`frame` arguments.
+
+# .. note:: For a quick look at large videos, the source can skip, crop and downscale the frames while decoding them: `FrameSource(input_folder, stride=4, roi=(x, y, width, height), scale=0.25)`, given to `inputconfig(input_folder, source=...)` and to the next steps. `backend="ffmpeg"` lets ffmpeg do it, if it is installed. `mactrack_pipeline` takes the same options as `decode={"stride": 4, "scale": 0.25}`.
+
 
 # Delete the list_sep and list_comp folder if they already exist (to not have a differnet size in the folder than the one you mentionned: 'n'). As the output folder is common to all the different inputs you can add :
 if os.path.exists("output/list_sep"):
@@ -67,13 +60,12 @@ create_dataset_csv(
 
 #############################################################
 # We can now begin the tracking of the macrophages in the red channel video. The following function will create a folder called `output` in the current directory, and inside it, two folders : `list_comp` and `list_sep`. The first one contains the segmentation of each frame, and the second one contains each object in separate picture file at each frame. They will have a role in the next steps of the tracking process.
-locate(input_folder)
-
-
-# This will save all the picture in a python class in order to accelerate the program
+# The objects found at each frame are also kept in a python class in order to accelerate the program, so they do not have to be read back from `list_sep`.
 output_path = os.path.join(current_dir, r"output")
 image_storage = segmentation(os.path.join(output_path, "list_sep"))
-image_storage.load_images()
+locate(input_folder, image_storage=image_storage)
+
+# .. note:: If you already ran `locate`, you can instead load the objects saved in `list_sep` with `image_storage.load_images()`. To rerun the next steps faster, you can also save them once in a single archive with `image_storage.save_archive("output/list_sep.npz")` and read it back with `image_storage.load_images(archive="output/list_sep.npz")`.
 
 
 # This will prevent and separate the merging macrophage. In fact, two nearby macrophages can be detected as one object. This function will separate them and create a new folder called `list_def` in the `output` folder, containing the separated objects.
@@ -82,20 +74,24 @@ image_storage = invdefuse(n, image_storage)
 # Then, we obtain a "definitive" list of segmented macrophages, which is stored in the `output/list_def` folder. This list is used to track the macrophages in the next step.
 
 # This will do the tracking of every macrophage and filter if you detect a macrophage on enough frame
-track(n, threshold_iou=0.5, image_storage=image_storage)
-supprimer_petit(p)
+# .. note:: `mode="hungarian"` matches each macrophage to one track at most, from the overlap and the distance between the macrophages, and can continue a track after a few frames where the macrophage was missed (`window`).
+tracks = track(n, threshold_iou=0.5, image_storage=image_storage)
+supprimer_petit(p, tracks)
+
+# This will create in the output folder two video which show the results of the tracking : `result_video.mp4` contains the tracking of the segmented macrophages on the red channel video, and `result_video_v.mp4` on the green channel video. The tracks are drawn from memory, without reading back the `list_track` folders, and the frames are encoded directly into the videos.
+result(input_folder, tracks=tracks, image_storage=image_storage)
+
+# .. note:: To also keep every frame as an image, in `output/result` and `output/resultv`, use `result(..., save_frames=True)`. `video()` can then encode these images again.
 
-# This will create in the output folder two video which show the results of the tracking
-result(input_folder)
+# .. note:: To try other parameters without running everything again, the same steps can be run by `mactrack_pipeline(input_folder, threshold_iou=0.5, p=p).run()` (from `mactrack.pipeline.runner`). Each step is cached in `output/.cache` according to the videos, the models and its parameters, so changing `p` for instance only reruns the filtering, the analysis and the videos.
 
-# We finally can merge all the fully segmented frames in a single video. We will obtain two videos : `result.mp4` and `resultv.mp4`. The first one contains the tracking of the segmented macrophages on the red channel video, and the second one contains the tracking of the segmented macrophages on the green channel video. Both videos are stored in the `output` folder.
-video()
+# .. note:: Every step writes to `output` in the current directory by default. Pass `context=RunContext(output_root=...)` (from `mactrack.pipeline.context`) to the steps, or to `mactrack_pipeline`, to write somewhere else, and `RunContext(backend="memory")` to keep the intermediate images (`list_sep`, `list_def`, `list_track`, ...) in memory only.
+
+# .. note:: Several videos can be processed at once with `run_batch("manifest.csv", "batch")` (from `mactrack.pipeline.batch`), where the manifest lists a `name` and an `input_folder` per video, and optionally `threshold_iou`, `p`, `min_shape_size`, `mode`, `split`, `chunk_size` and `workers`. Each video is processed by its own worker process in `batch/<name>`, and the summary of all the videos is written to `batch/results_summary.xlsx`.
 
 # This is for deleting non necessary folder to liberate some place. You can add a '#' before the lines below if you want to keep the folders.
 shutil.rmtree("output/list_def")
 shutil.rmtree("output/list_sep")
-shutil.rmtree("output/result")
-shutil.rmtree("output/resultv")
 
 # This is to create folder who will contain the data
 if not os.path.exists("output/data"):
@@ -103,11 +99,17 @@ if not os.path.exists("output/data"):
 if not os.path.exists("output/plot"):
     os.makedirs("output/plot")
 
-# These will collect the data and stock them in dataframe
-intmed = intensitymed(n, frame, input_folder)  # Data on the intensity of macrophage
-dis = distance(n)  # data of distance to the right border
-siz = size(n)  # data of the size of the macrophage
-per = perimeter(n)  # data of the perimeter of the macrophage
+# These will collect the data and stock them in dataframes. Every tracked macrophage is measured once, and the tables of each measure are then built from these features.
+features = extract_features(
+    n, frame, cv2.imread(os.path.join(input_folder, "vert/mediane.png"))
+)
+intmed = intensitymed(
+    n, frame, input_folder, features
+)  # Data on the intensity of macrophage
+dis = distance(n, features)  # data of distance to the right border
+siz = size(n, features)  # data of the size of the macrophage
+per = perimeter(n, features)  # data of the perimeter of the macrophage
 recap = aggregate(
-    dis, intmed, siz, per
+    dis, intmed, siz, per, excel=True
 )  # summary of each data for each macrophage in a movie
+# .. note:: The tables are saved as Parquet files in `output/data` and handed to each other as DataFrames. Add `excel=True` to any of the functions above to also export its table as an Excel file.
@@ -1,6 +1,7 @@
 submodules = [
     "analyse",
     "locate",
+    "pipeline",
     "track",
     "video",
     "visualisation",
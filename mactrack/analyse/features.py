@@ -0,0 +1,242 @@
+import os
+import sys
+import cv2
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from pipeline.context import run_context
+from locate.objects import (
+    folder_objects,
+    object_contours,
+    stored_contours,
+    table_objects,
+)
+
+FEATURE_COLUMNS = [
+    "track",
+    "frame",
+    "object",
+    "area",
+    "perimeter",
+    "distance",
+    "intensity",
+    "intensity_max",
+    "intensity_percentile",
+    "intensity_integrated",
+]
+
+
+def _green_frames(frame):
+    """Yield ``(index, green frame)`` pairs from a VideoFrames or a FrameSource."""
+    if hasattr(frame, "frames_v"):
+        yield from enumerate(frame.frames_v)
+    else:
+        for a, _, frame_v in frame:
+            yield a, frame_v
+
+
+def ratio_stats(mask, green_a, green_f0, q=90):
+    """Statistics of ΔF/F0 over the pixels of a mask.
+
+    The ratio is only defined where F0 is not zero, but the mean divides the
+    sum of the ratios by the number of pixels of the whole mask.
+
+    Args:
+        mask (numpy.ndarray): Boolean mask of the object.
+        green_a (numpy.ndarray): Green channel (F) on the same pixels as ``mask``.
+        green_f0 (numpy.ndarray): Green channel of the reference (F0).
+        q (float): Percentile of the ratios to report.
+
+    Returns:
+        dict: ``mean``, ``max`` and ``percentile`` of the ratios (0 for an
+        empty mask, NaN for ``max`` and ``percentile`` without any ratio)
+        and ``integrated``, the sum of F over the mask.
+    """
+    f = green_a[mask]
+    f_0 = green_f0[mask]
+    valid = f_0 != 0
+    ratios = (f[valid] - f_0[valid]) / f_0[valid]
+    return {
+        "mean": ratios.sum() / len(f) if len(f) else 0,
+        "max": ratios.max() if len(ratios) else np.nan,
+        "percentile": np.percentile(ratios, q) if len(ratios) else np.nan,
+        "integrated": f.sum(),
+    }
+
+
+def frame_ratios(objects_contours, image_a, image_f0, q=90):
+    """ΔF/F0 statistics of all the objects of a frame.
+
+    The green channels are extracted once for the frame. Each object is then
+    rasterized in the bounding box of its first contour only, as
+    :func:`ratio_stats` needs.
+
+    Args:
+        objects_contours (list): Contours of each object, in frame coordinates.
+        image_a (numpy.ndarray): BGR frame.
+        image_f0 (numpy.ndarray): BGR reference image (F0).
+        q (float): Percentile of the ratios to report.
+
+    Returns:
+        list: :func:`ratio_stats` of each object.
+    """
+    if image_a.shape != image_f0.shape:
+        raise ValueError("Image dimensions do not match.")
+    green_a = image_a[:, :, 1].astype(np.float64)
+    green_f0 = image_f0[:, :, 1].astype(np.float64)
+
+    stats = []
+    for contours in objects_contours:
+        x, y, w, h = cv2.boundingRect(contours[0])
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.drawContours(
+            mask, contours, -1, (255), thickness=cv2.FILLED, offset=(-x, -y)
+        )
+        stats.append(
+            ratio_stats(
+                mask == 255,
+                green_a[y : y + h, x : x + w],
+                green_f0[y : y + h, x : x + w],
+                q,
+            )
+        )
+    return stats
+
+
+def contour_ratio(contours, image_a, image_f0):
+    """Mean ΔF/F0 of the green channel inside filled contours.
+
+    Args:
+        contours (list): Contours of the object, in frame coordinates.
+        image_a (numpy.ndarray): BGR frame.
+        image_f0 (numpy.ndarray): BGR reference image (F0).
+
+    Returns:
+        float: Mean ratio, see :func:`ratio_stats`.
+    """
+    return frame_ratios([contours], image_a, image_f0)[0]["mean"]
+
+
+def extract_features(
+    n,
+    frame=None,
+    f0=None,
+    base_folder=None,
+    tracks=None,
+    image_storage=None,
+    q=90,
+    context=None,
+):
+    """Measure every tracked macrophage in a single pass.
+
+    Each tracked object is visited once, frame by frame, and its contour
+    gives its area, its perimeter and the distance of its centroid to the
+    right edge of the frame. When the green frames and F0 are given, the
+    ΔF/F0 statistics of all the objects of a frame are computed together by
+    :func:`frame_ratios`, from the same contours, so each green frame is
+    read once.
+
+    The objects are read from the track folders of ``base_folder``, or taken
+    from ``tracks`` and ``image_storage`` when both are given.
+
+    Args:
+        n (int): Number of frames.
+        frame (VideoFrames or FrameSource, optional): The green frames.
+        f0 (numpy.ndarray, optional): BGR reference image of the intensity,
+            e.g. 'vert/mediane.png'.
+        base_folder (str, optional): Folder of the 'macrophage_<id>' track
+            folders. Defaults to 'list_track' in the output root.
+        tracks (TrackTable, optional): The tracks.
+        image_storage (ObjectStore, optional): Objects of ``tracks``.
+        q (float): Percentile of ΔF/F0 reported in ``intensity_percentile``.
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+
+    Returns:
+        pandas.DataFrame: One row per tracked object, with the columns of
+        ``FEATURE_COLUMNS``. ``intensity`` is the mean ΔF/F0, and the
+        intensity columns are NaN without green frames.
+    """
+    if tracks is not None and image_storage is not None:
+        objects = table_objects(tracks)
+    else:
+        objects = folder_objects(base_folder or run_context(context).path("list_track"))
+
+    if frame is not None and f0 is not None:
+        green_frames = _green_frames(frame)
+    else:
+        green_frames = ((a, None) for a in range(n))
+
+    rows = []
+    for a, frame_v in green_frames:
+        if a >= n:
+            break
+        frame_rows, frame_contours = [], []
+        for track_id, obj, path in sorted(objects.get(a, [])):
+            if path is None:
+                contours = stored_contours(image_storage, a, obj)
+                width = image_storage.shape[1]
+            else:
+                image = cv2.imread(path)
+                if image is None:
+                    raise ValueError("L'image n'a pas pu être chargée.")
+                contours = object_contours(image)
+                width = image.shape[1]
+            if not contours:
+                raise ValueError("Aucun contour n'a été détecté dans l'image.")
+
+            contour = contours[0]
+            M = cv2.moments(contour)
+            distance = width - int(M["m10"] / M["m00"]) if M["m00"] != 0 else np.nan
+            frame_rows.append(
+                [
+                    track_id,
+                    a,
+                    obj,
+                    cv2.contourArea(contour),
+                    cv2.arcLength(contour, True),
+                    distance,
+                ]
+            )
+            frame_contours.append(contours)
+
+        if frame_v is not None and frame_rows:
+            for row, stats in zip(
+                frame_rows, frame_ratios(frame_contours, frame_v, f0, q)
+            ):
+                row += [
+                    stats["mean"],
+                    stats["max"],
+                    stats["percentile"],
+                    stats["integrated"],
+                ]
+        else:
+            for row in frame_rows:
+                row += [np.nan] * 4
+        rows.extend(frame_rows)
+    return pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+
+
+def wide_table(features, column, n):
+    """Pivot one feature to the report layout, one row per track and one column per frame.
+
+    The first column, 'Time', holds the 'macrophage_<id>' track names, and the
+    frames without object are NaN. When a track has several
+    objects in a frame, the one with the smallest id is kept.
+
+    Args:
+        features (pandas.DataFrame): Table returned by :func:`extract_features`.
+        column (str): Feature to report.
+        n (int): Number of frames.
+
+    Returns:
+        pandas.DataFrame: The report.
+    """
+    first = features.sort_values(["track", "frame", "object"]).drop_duplicates(
+        ["track", "frame"]
+    )
+    table = first.pivot(index="track", columns="frame", values=column)
+    table = table.reindex(index=sorted(features["track"].unique()), columns=range(n))
+    table.columns = [f"{a}" for a in table.columns]
+    table.insert(0, "Time", [f"macrophage_{t}" for t in table.index])
+    return table.reset_index(drop=True)
@@ -1,12 +1,21 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.signal import find_peaks
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from analyse.results import data_folder, load_table, save_table
+from pipeline.context import run_context
+from visualisation.style import TrackStyle
 
-def load_data(file_path):
-    data = pd.read_excel(file_path, index_col=0)
-    return data
+
+def load_data(data):
+    """Table of one measure indexed by track, from a DataFrame or a .parquet/.xlsx path."""
+    if not isinstance(data, pd.DataFrame):
+        data = load_table(data)
+    return data.set_index(data.columns[0])
 
 
 def calculate_intensity_features(intensity_data):
@@ -44,11 +53,15 @@ def count_valid_entries(data):
     return num_valid_entries
 
 
-def plot_intensity_curves(intensity_data, valid_entry_counts, threshold=10):
+def plot_intensity_curves(
+    intensity_data, valid_entry_counts, threshold=10, context=None, style=None
+):
+    style = style or TrackStyle()
     filtered_data = intensity_data[valid_entry_counts > threshold]
-    output_folder = "output/plot"
+    output_folder = run_context(context).path("plot")
+    os.makedirs(output_folder, exist_ok=True)
     for index, row in filtered_data.iterrows():
-        plt.plot(row)
+        plt.plot(row, color=style.plot_color(index))
         plt.xlabel("Temps")
         plt.ylabel("Intensité")
         plt.title(f"Courbe d'intensité pour l'entrée {index}")
@@ -56,8 +69,27 @@ def plot_intensity_curves(intensity_data, valid_entry_counts, threshold=10):
         plt.close()
 
 
-def aggregate(distance_file, intensity_file, size_file, perimeter_file):
-    output_file = "output/data/data.xlsx"
+def aggregate(
+    distance_file,
+    intensity_file,
+    size_file,
+    perimeter_file,
+    excel=False,
+    context=None,
+    style=None,
+):
+    """Summarize the measures of every tracked macrophage.
+
+    Args:
+        distance_file, intensity_file, size_file, perimeter_file: Tables of
+            the measures, as returned by the analyse functions, or paths to them.
+        excel (bool): Whether to also export the summary to 'data/data.xlsx'.
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+        style (TrackStyle, optional): Colours of the tracks in the intensity curves.
+
+    Returns:
+        pandas.DataFrame: The summary, also saved to 'data/data.parquet'.
+    """
     distance_data = load_data(distance_file)
     intensity_data = load_data(intensity_file)
     size_data = load_data(size_file)
@@ -81,7 +113,12 @@ def aggregate(distance_file, intensity_file, size_file, perimeter_file):
         }
     )
 
-    aggregated_data.to_excel(output_file, engine="openpyxl")
+    output_file = save_table(
+        aggregated_data, "data", excel, index=True, folder=data_folder(context)
+    )
     print(f"Les données agrégées ont été enregistrées dans {output_file}")
-    plot_intensity_curves(intensity_data, valid_entry_counts)
+    plot_intensity_curves(
+        intensity_data, valid_entry_counts, context=context, style=style
+    )
     print(f"Les courbes d'intensité ont été enregistrées pour les entrées valides")
+    return aggregated_data
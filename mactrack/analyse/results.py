@@ -0,0 +1,58 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from pipeline.context import run_context
+
+
+def data_folder(context=None):
+    """Folder of the results tables, 'data' in the output root."""
+    return run_context(context).path("data")
+
+
+def table_path(name, folder=None):
+    """Path of the Parquet file of a results table."""
+    return os.path.join(folder or data_folder(), f"{name}.parquet")
+
+
+def save_table(df, name, excel=False, index=False, folder=None):
+    """Write a results table to ``<folder>/<name>.parquet``.
+
+    Args:
+        df (pandas.DataFrame): The table.
+        name (str): Name of the table, e.g. 'size'.
+        excel (bool): Whether to also export it to ``<folder>/<name>.xlsx``,
+            with "NA" for the missing values.
+        index (bool): Whether to keep the index of ``df``.
+        folder (str, optional): Folder of the results. Defaults to 'output/data'.
+
+    Returns:
+        str: Path to the Parquet file.
+    """
+    folder = folder or data_folder()
+    os.makedirs(folder, exist_ok=True)
+    path = table_path(name, folder)
+    df.to_parquet(path, index=index)
+    if excel:
+        excel_file = os.path.join(folder, f"{name}.xlsx")
+        df.to_excel(excel_file, index=index, engine="openpyxl", na_rep="NA")
+        print(f"Report saved to {excel_file}")
+    return path
+
+
+def load_table(name, folder=None):
+    """Read a results table, from its name or from a ``.parquet`` or ``.xlsx`` path.
+
+    A table given by name is read from its Parquet file, or from its Excel
+    file when only that one exists.
+    """
+    if name.endswith(".xlsx"):
+        return pd.read_excel(name)
+    if name.endswith(".parquet"):
+        return pd.read_parquet(name)
+    folder = folder or data_folder()
+    path = table_path(name, folder)
+    if not os.path.exists(path):
+        return pd.read_excel(os.path.join(folder, f"{name}.xlsx"))
+    return pd.read_parquet(path)
@@ -1,19 +1,25 @@
 import os
-import pandas as pd
-import re
-import cv2
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from analyse.features import extract_features, wide_table
+from analyse.results import data_folder, load_table, save_table
+from pipeline.context import run_context
+from visualisation.style import TrackStyle
+
 
 def count_valid_entries(data):
     num_valid_entries = data.notna().sum(axis=1)
     return num_valid_entries
 
 
-def graph():
-    file_path = "output/data/size.xlsx"
-    data = pd.read_excel(file_path)
+def graph(data=None, context=None, style=None):
+    context = run_context(context)
+    style = style or TrackStyle()
+    if data is None:
+        data = load_table("size", data_folder(context))
     data = data.fillna(0)
     individus = data.iloc[:, 0]
     intensites = data.iloc[:, 1:]
@@ -24,66 +30,36 @@ def graph():
         x = intensites.columns
         y_masked = np.where(y == threshold, np.nan, y)
 
-        plt.plot(x, y_masked, label=individu)
+        plt.plot(x, y_masked, label=individu, color=style.plot_color(individu))
     step = 5
     plt.xticks(intensites.columns[::step], rotation=45)
     plt.xlabel("Temps")
     plt.ylabel("taille")
     plt.title("Courbes de taille des individus au cours du temps")
-    plt.savefig("output/plot/courbes_taille_individus.png", format="png")
+    os.makedirs(context.path("plot"), exist_ok=True)
+    plt.savefig(context.path("plot", "courbes_taille_individus.png"), format="png")
     plt.close()
 
 
-def object_size(image_path):
-    image = cv2.imread(image_path)
-
-    if image is None:
-        raise ValueError("L'image n'a pas pu être chargée.")
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    if not contours:
-        raise ValueError("Aucun contour n'a été détecté dans l'image.")
-    contour = contours[0]
-    object_area = cv2.contourArea(contour)
-
-    return object_area
-
-
-def size(n):
-    base_folder = "output/list_track"
-    output_file = "output/data/size.xlsx"
-    if not output_file.endswith(".xlsx"):
-        raise ValueError("Output file must have an .xlsx extension")
-
-    folders = [
-        d
-        for d in os.listdir(base_folder)
-        if os.path.isdir(os.path.join(base_folder, d)) and d.startswith("macrophage_")
-    ]
-    folders.sort(key=lambda x: int(re.findall(r"\d+", x)[0]))
-    results = []
-    for folder in folders:
-        folder_path = os.path.join(base_folder, folder)
-        folder_result = {"Time": folder}
-        print(folder_path)
-        for a in range(0, n):
-            found = False
-
-            for file in os.listdir(folder_path):
-                if re.match(rf"{a}_\d+\.png", file):
-                    found = True
-                    input = os.path.join(folder_path, file)
-                    x = object_size(input)
-                    folder_result[f"{a}"] = x
-                    break
-            if not found:
-                folder_result[f"{a}"] = "NA"
-
-        results.append(folder_result)
-    df = pd.DataFrame(results)
-    df.to_excel(output_file, index=False, engine="openpyxl")
-    print(f"Report saved to {output_file}")
-    graph()
-    return output_file
+def size(n, features=None, excel=False, context=None, style=None):
+    """Report the area of every tracked macrophage, frame by frame.
+
+    Args:
+        n (int): Number of frames in the video.
+        features (pandas.DataFrame, optional): Table returned by
+            :func:`analyse.features.extract_features`. Computed from
+            'list_track' if not given.
+        excel (bool): Whether to also export the table to 'data' as xlsx.
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+        style (TrackStyle, optional): Colours of the tracks in the graph.
+
+    Returns:
+        pandas.DataFrame: The table, also saved as Parquet in 'data'.
+    """
+    context = run_context(context)
+    if features is None:
+        features = extract_features(n, context=context)
+    df = wide_table(features, "area", n)
+    save_table(df, "size", excel, folder=data_folder(context))
+    graph(df, context, style)
+    return df
@@ -2,27 +2,61 @@ import pandas as pd
 import os
 
 
-def tabglobal(result_path):
+def _read_summary(folder_path):
+    """Summary of an experiment folder, from 'data' or 'output/data', or None."""
+    for data_folder in ("data", os.path.join("output", "data")):
+        file_path = os.path.join(folder_path, data_folder, "data.parquet")
+        if os.path.exists(file_path):
+            return pd.read_parquet(file_path).reset_index()
+        file_path = os.path.join(folder_path, data_folder, "data.xlsx")
+        if os.path.exists(file_path):
+            return pd.read_excel(file_path)
+    return None
+
+
+def tabglobal(result_path, excel=True, summary_folder="."):
+    """Count the tracked macrophages and their peaks in every experiment folder.
+
+    The summary of each experiment is read from 'data/data.parquet', or from
+    'data/data.xlsx' for the experiments analysed before. The 'output/data'
+    folder of an experiment run by :func:`pipeline.batch.run_batch` is also
+    looked for.
+
+    Args:
+        result_path (str): Folder containing one output folder per experiment.
+        excel (bool): Whether to also write 'results_summary.xlsx'.
+        summary_folder (str): Folder of the 'results_summary' files.
+
+    Returns:
+        pandas.DataFrame: One row per experiment, also saved to 'results_summary.parquet'.
+    """
     results = []
     for folder_name in os.listdir(result_path):
         folder_path = os.path.join(result_path, folder_name)
 
         if os.path.isdir(folder_path):
-            file_path = os.path.join(folder_path, "data", "data.xlsx")
-
-            if os.path.exists(file_path):
-                df = pd.read_excel(file_path)
-                num_time_rows = df["Time"].notna().sum()
-                num_peaks_positive = (df["peaks"] > 0).sum()
-                sum_peaks = df["peaks"].sum()
-                results.append(
-                    {
-                        "folder": folder_name,
-                        "num_time_rows": num_time_rows,
-                        "num_peaks_positive": num_peaks_positive,
-                        "sum_peaks": sum_peaks,
-                    }
-                )
+            df = _read_summary(folder_path)
+            if df is None:
+                continue
+
+            num_time_rows = df["Time"].notna().sum()
+            num_peaks_positive = (df["peaks"] > 0).sum()
+            sum_peaks = df["peaks"].sum()
+            results.append(
+                {
+                    "folder": folder_name,
+                    "num_time_rows": num_time_rows,
+                    "num_peaks_positive": num_peaks_positive,
+                    "sum_peaks": sum_peaks,
+                }
+            )
 
     results_df = pd.DataFrame(results)
-    results_df.to_excel("results_summary.xlsx", index=False)
+    results_df.to_parquet(
+        os.path.join(summary_folder, "results_summary.parquet"), index=False
+    )
+    if excel:
+        results_df.to_excel(
+            os.path.join(summary_folder, "results_summary.xlsx"), index=False
+        )
+    return results_df
@@ -1,29 +1,51 @@
 import cv2
 import numpy as np
 import os
+import sys
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from pipeline.context import run_context
 
 
 def trace_lines_between_contours(images, distance_threshold=50):
-    traced_lines_image = np.zeros_like(images[0])
-    all_contours = []
+    """Draw a line between every pair of close points of the contours of different objects.
+
+    The pairs of contour points closer than ``distance_threshold`` are found
+    at once with a KD-tree, and all the lines are drawn by a single
+    ``cv2.polylines`` call.
+
+    Args:
+        images (list): uint8 masks of the objects.
+        distance_threshold (float): Points strictly closer are joined.
 
+    Returns:
+        numpy.ndarray: Image of the lines, 255 on the lines.
+    """
+    traced_lines_image = np.zeros_like(images[0])
+    points, owners = [], []
     for image in images:
         contours, _ = cv2.findContours(
             image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
         )
-        all_contours.extend(contours)
-
-    for i in range(len(all_contours)):
-        for j in range(i + 1, len(all_contours)):
-            cnt1 = all_contours[i]
-            cnt2 = all_contours[j]
-            for point1 in cnt1:
-                for point2 in cnt2:
-                    dist = np.linalg.norm(point1 - point2)
-                    if dist < distance_threshold:
-                        pt1 = tuple(point1[0])
-                        pt2 = tuple(point2[0])
-                        cv2.line(traced_lines_image, pt1, pt2, (255), 1)
+        for contour in contours:
+            points.append(contour.reshape(-1, 2))
+            owners.append(np.full(len(contour), len(owners)))
+    if len(points) < 2:
+        return traced_lines_image
+
+    points = np.concatenate(points)
+    owners = np.concatenate(owners)
+    # query_pairs keeps distances <= r, the lines are drawn for distances < threshold
+    radius = np.nextafter(distance_threshold, 0)
+    pairs = cKDTree(points).query_pairs(radius, output_type="ndarray")
+    pairs = pairs[owners[pairs[:, 0]] != owners[pairs[:, 1]]]
+    if len(pairs):
+        # Points are ordered by contour, so each line starts on the first contour
+        pairs.sort(axis=1)
+        lines = points[pairs].astype(np.int32)
+        cv2.polylines(traced_lines_image, list(lines), False, 255, 1)
 
     return traced_lines_image
 
@@ -45,34 +67,48 @@ def paint_black_area_from_mask(image_c, mask):
     return image_c_black
 
 
+def contour_object(image_c, contour):
+    """Pixels of ``image_c`` inside a filled external contour, as a full-frame CSR matrix.
+
+    The contour is filled in its bounding box only, holes included, and the
+    object keeps the pixels of ``image_c`` there, so the pixels painted
+    black to split ``image_c`` are given back to the part that encloses them.
+    """
+    if image_c.ndim == 3:
+        image_c = image_c[:, :, 0]
+    x, y, w, h = cv2.boundingRect(contour)
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.drawContours(mask, [contour], -1, 255, thickness=cv2.FILLED, offset=(-x, -y))
+    rows, cols = np.nonzero((mask > 0) & (image_c[y : y + h, x : x + w] > 127))
+    data = np.full(len(rows), 255, dtype=np.uint8)
+    return csr_matrix((data, (rows + y, cols + x)), shape=image_c.shape[:2])
+
+
 def extract_and_save_objects(
     image_c, image, heatmap, object, image_storage, min_object_size=100
 ):
+    """Store the parts of a split object, the first one replacing ``object``.
+
+    The parts are the external contours of ``image`` whose polygon area is at
+    least ``min_object_size``, filled and intersected with ``image_c`` (see
+    :func:`contour_object`). Only the bounding box of each part is drawn.
+    """
     image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     contours, _ = cv2.findContours(
         image_gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
     )
-    replaced = False
-    n = len(image_storage.get_list(f"heatmap_test_{heatmap}"))
-    j = 0
-    for i, contour in enumerate(contours):
-        if cv2.contourArea(contour) < min_object_size:
-            continue
-        mask = np.zeros_like(image_gray)
-        object_image = cv2.drawContours(
-            mask, [contour], -1, (255, 255, 255), thickness=cv2.FILLED
-        )
-        object_image = cv2.bitwise_and(image_c, image_c, mask=mask)
-        if not replaced:
+    contours = [c for c in contours if cv2.contourArea(c) >= min_object_size]
+    n = len(image_storage.objects(heatmap))
+    for k, contour in enumerate(contours):
+        object_image = contour_object(image_c, contour)
+        if k == 0:
             image_storage.replace_image(
                 f"heatmap_test_{heatmap}", f"object_{object}.png", object_image
             )
-            replaced = True
         else:
             image_storage.add_image(
-                f"heatmap_test_{heatmap}", f"object_{n+j}.png", object_image
+                f"heatmap_test_{heatmap}", f"object_{n+k-1}.png", object_image
             )
-            j = j + 1
     return image_storage
 
 
@@ -95,6 +131,96 @@ def process_images(list, image_c, heatmap, object, image_storage, max_line_lengt
     return image_storage
 
 
+def watershed_split(
+    image_storage, frame, obj, reference, reference_ids, min_object_size=100
+):
+    """Split a merged object with a watershed seeded by the objects of a reference frame.
+
+    Everything is computed in the bounding box of the merged object: the
+    parts of the reference objects inside the merged object are the markers,
+    and the watershed floods the inverted distance transform of the merged
+    object. The part grown from each marker becomes an object, and the
+    pixels of the merged object left on watershed boundaries or flooded from
+    the background go to the nearest part, so the parts add up to the merged
+    object. The first part replaces ``obj`` and the others are added to the
+    frame.
+
+    Args:
+        image_storage (ObjectStore): The segmented objects, modified in place.
+        frame (int): Frame of the merged object.
+        obj (int): Id of the merged object.
+        reference (int): Frame of the markers.
+        reference_ids (list): Ids of the objects of ``reference`` overlapping ``obj``.
+        min_object_size (int): Smaller parts are merged into their nearest part.
+
+    Returns:
+        ObjectStore: ``image_storage``.
+    """
+    x, y, w, h = image_storage.bbox(frame, obj)
+    mask = image_storage.mask(frame, obj)
+    background = len(reference_ids) + 1
+    markers = np.full((h, w), background, dtype=np.int32)
+    markers[mask] = 0
+    for r, k in enumerate(reference_ids):
+        xk, yk, wk, hk = image_storage.bbox(reference, k)
+        x0, y0 = max(x, xk), max(y, yk)
+        x1, y1 = min(x + w, xk + wk), min(y + h, yk + hk)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        seed = np.zeros((h, w), dtype=bool)
+        seed[y0 - y : y1 - y, x0 - x : x1 - x] = image_storage.mask(reference, k)[
+            y0 - yk : y1 - yk, x0 - xk : x1 - xk
+        ]
+        markers[seed & mask] = r + 1
+
+    # The padding keeps the watershed boundary of the crop off the object
+    padded = cv2.copyMakeBorder(
+        mask.astype(np.uint8), 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0
+    )
+    markers = cv2.copyMakeBorder(
+        markers, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=background
+    )
+    distance = cv2.distanceTransform(padded, cv2.DIST_L2, 3)
+    relief = 255 - cv2.normalize(distance, None, 0, 255, cv2.NORM_MINMAX)
+    cv2.watershed(cv2.merge([relief.astype(np.uint8)] * 3), markers)
+    labels = markers[1:-1, 1:-1]
+
+    parts = [r + 1 for r in range(len(reference_ids)) if (labels == r + 1).any()]
+    if not parts:
+        return image_storage
+    labels = _fill_nearest(mask, labels, parts)
+    parts = [r for r in parts if (labels == r).sum() >= min_object_size]
+    if not parts:
+        return image_storage
+    labels = _fill_nearest(mask, labels, parts)
+
+    new_id = max(image_storage.objects(frame)) + 1
+    for k, r in enumerate(parts):
+        part = (labels == r).astype(np.uint8) * 255
+        image_storage.add(frame, obj if k == 0 else new_id + k - 1, part, (x, y))
+    return image_storage
+
+
+def _fill_nearest(mask, labels, parts):
+    """Give every pixel of ``mask`` outside ``parts`` to the nearest of them.
+
+    The watershed boundaries (-1), the pixels flooded from the background
+    and the pixels of dropped parts are all reassigned, so that the parts
+    cover the whole mask.
+    """
+    distances = np.stack(
+        [
+            cv2.distanceTransform((labels != r).astype(np.uint8), cv2.DIST_L2, 3)
+            for r in parts
+        ]
+    )
+    nearest = np.asarray(parts, dtype=labels.dtype)[distances.argmin(axis=0)]
+    labels = labels.copy()
+    orphans = mask & ~np.isin(labels, parts)
+    labels[orphans] = nearest[orphans]
+    return labels
+
+
 def calculate_iou(image1, image2):
     intersection = np.logical_and(image1, image2).sum()
     union = np.logical_or(image1, image2).sum()
@@ -105,90 +231,123 @@ def save_segmentation_images(segmentation_instance, output_folder):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    for dir_name, objects_list in segmentation_instance.images:
-        heatmap_folder = os.path.join(output_folder, dir_name)
+    for frame in segmentation_instance.frames():
+        heatmap_folder = os.path.join(output_folder, f"heatmap_test_{frame}")
         os.makedirs(heatmap_folder, exist_ok=True)
 
-        for file_name, sparse_image in objects_list:
-            dense_image = sparse_image.toarray().astype(np.uint8)
-            image_path = os.path.join(heatmap_folder, file_name)
+        for obj in segmentation_instance.objects(frame):
+            dense_image = segmentation_instance.dense(frame, obj)
+            image_path = os.path.join(heatmap_folder, f"object_{obj}.png")
             cv2.imwrite(image_path, dense_image)
 
 
-def defuse(n, image_storage):
-    c = 0
-    for i in range(1, n):
-        print(f"heatmap_test_{i}")
-        current = len(image_storage.get_list(f"heatmap_test_{i}"))
-        for j in range(current):
-            image1 = image_storage.get_image(f"heatmap_test_{i}", f"object_{j}.png")
-            if image1 is not None:
-                image1 = image1.toarray()
-                _, image1 = cv2.threshold(image1, 127, 255, cv2.THRESH_BINARY)
-            else:
-                print(i, j)
+def overlap_table(labels_a, n_a, labels_b, n_b):
+    """Number of pixels shared by every pair of objects of two label images.
 
-            matches = []
-            previous = len(image_storage.get_list(f"heatmap_test_{i-1}"))
-            for k in range(previous):
-                image2 = image_storage.get_image(
-                    f"heatmap_test_{i-1}", f"object_{k}.png"
-                )
-                if image2 is not None:
-                    image2 = image2.toarray()
-                    _, image2 = cv2.threshold(image2, 127, 255, cv2.THRESH_BINARY)
-                else:
-                    print(i - 1, k)
-                iou = calculate_iou(image1, image2)
-                if iou > 0:
-                    matches.append(image2)
-                    c += 1
-            if c > 1:
-                print(i, j)
-                image_storage = process_images(matches, image1, i, j, image_storage)
-            c = 0
-    return image_storage
+    The pairs of labels of the pixels covered in both images are counted in a
+    single ``np.bincount``.
 
+    Args:
+        labels_a (numpy.ndarray): Label image, 0 for the background and
+            ``r + 1`` for object ``r``.
+        n_a (int): Number of objects of ``labels_a``.
+        labels_b (numpy.ndarray): Label image of the same shape.
+        n_b (int): Number of objects of ``labels_b``.
 
-def invdefuse(n, image_storage):
-    caller_dir = os.path.dirname(os.path.abspath(__file__))
-    parent = os.path.dirname(caller_dir)
-    root = os.path.dirname(parent)
-    output_path = os.path.join(root, r"output")
-
-    c = 0
-    for i in range(1, n):
-        print(f"heatmap_test_{n-i-1}")
-        current = len(image_storage.get_list(f"heatmap_test_{n-i-1}"))
-        for j in range(current):
-            image1 = image_storage.get_image(f"heatmap_test_{n-i-1}", f"object_{j}.png")
-            if image1 is not None:
-                image1 = image1.toarray()
-                _, image1 = cv2.threshold(image1, 127, 255, cv2.THRESH_BINARY)
-            else:
-                print(n - i - 1, j)
+    Returns:
+        numpy.ndarray: (n_a, n_b) contingency table of the overlaps.
+    """
+    both = (labels_a > 0) & (labels_b > 0)
+    pairs = (labels_a[both].astype(np.int64) - 1) * n_b + labels_b[both] - 1
+    return np.bincount(pairs, minlength=n_a * n_b).reshape(n_a, n_b)
 
-            matches = []
-            previous = len(image_storage.get_list(f"heatmap_test_{n-i}"))
-            for k in range(previous):
-                image2 = image_storage.get_image(
-                    f"heatmap_test_{n-i}", f"object_{k}.png"
+
+def _defuse_pass(image_storage, pairs, split="lines"):
+    """Split the objects overlapping several objects of a reference frame.
+
+    Args:
+        image_storage (ObjectStore): The segmented objects, modified in place.
+        pairs (list): (frame, reference frame) pairs, in processing order.
+        split (str): "lines" to split with :func:`process_images`, or
+            "watershed" to split with :func:`watershed_split`.
+
+    Returns:
+        ObjectStore: ``image_storage``.
+    """
+    if split not in ("lines", "watershed"):
+        raise ValueError(f"Unknown split mode: {split}")
+    # Label images of the frames of the current pair, recomputed after a split
+    label_images = {}
+
+    def labels(frame):
+        if frame not in label_images:
+            label_images[frame] = image_storage.label_image(frame)
+        return label_images[frame]
+
+    for frame, reference in pairs:
+        print(f"heatmap_test_{frame}")
+        for f in list(label_images):
+            if f not in (frame, reference):
+                del label_images[f]
+        ids = image_storage.frame_table(frame)["ids"].tolist()
+        ids_reference = image_storage.frame_table(reference)["ids"].tolist()
+        if not ids or not ids_reference:
+            continue
+        overlaps = overlap_table(
+            labels(frame), len(ids), labels(reference), len(ids_reference)
+        )
+        # Only the merged objects, overlapping several objects, are split
+        for r in np.nonzero((overlaps > 0).sum(axis=1) > 1)[0]:
+            j = ids[r]
+            print(frame, j)
+            matched = [ids_reference[c] for c in np.nonzero(overlaps[r])[0]]
+            if split == "watershed":
+                image_storage = watershed_split(
+                    image_storage, frame, j, reference, matched
                 )
-                if image2 is not None:
-                    image2 = image2.toarray()
-                    _, image2 = cv2.threshold(image2, 127, 255, cv2.THRESH_BINARY)
-                else:
-                    print(n - i, k)
-                iou = calculate_iou(image1, image2)
-                if iou > 0:
-                    matches.append(image2)
-                    c += 1
-            if c > 1:
-                print(n - i - 1, j)
+            else:
+                matches = [image_storage.dense(reference, k) for k in matched]
                 image_storage = process_images(
-                    matches, image1, n - i - 1, j, image_storage
+                    matches, image_storage.dense(frame, j), frame, j, image_storage
                 )
-            c = 0
+            label_images.pop(frame, None)
+    return image_storage
+
+
+def defuse(n, image_storage, split="lines"):
+    """Split the objects of each frame merging several objects of the previous frame.
+
+    Args:
+        n (int): Number of frames.
+        image_storage (segmentation): The segmented objects, modified in place.
+        split (str): "lines" or "watershed", see :func:`_defuse_pass`.
+
+    Returns:
+        segmentation: ``image_storage``.
+    """
+    return _defuse_pass(image_storage, [(i, i - 1) for i in range(1, n)], split)
+
+
+def invdefuse(n, image_storage, split="lines", context=None):
+    """Split the objects of each frame merging several objects of the next frame.
+
+    The frames are processed backwards, and the objects are then written to
+    'list_def' in the output root, unless the context keeps them in memory.
+
+    Args:
+        n (int): Number of frames.
+        image_storage (segmentation): The segmented objects, modified in place.
+        split (str): "lines" or "watershed", see :func:`_defuse_pass`.
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+
+    Returns:
+        segmentation: ``image_storage``.
+    """
+    context = run_context(context)
+    image_storage = _defuse_pass(
+        image_storage, [(n - i - 1, n - i) for i in range(1, n)], split
+    )
 
-    save_segmentation_images(image_storage, os.path.join(output_path, "list_def"))
+    if context.export:
+        save_segmentation_images(image_storage, context.path("list_def"))
     return image_storage
@@ -0,0 +1,158 @@
+import os
+import csv
+import cv2
+import numpy as np
+from scipy.sparse import csr_matrix
+
+OBJECTS_CSV = "objects.csv"
+OBJECTS_COLUMNS = [
+    "object",
+    "x",
+    "y",
+    "width",
+    "height",
+    "area",
+    "cx",
+    "cy",
+    "frame_height",
+    "frame_width",
+]
+
+
+class FrameLabels:
+    """Objects of a frame, found in one pass by connected-component labelling.
+
+    Attributes:
+        labels (numpy.ndarray): int32 label image, 0 for the background and
+            ``k + 1`` for the pixels of object ``k``.
+        bboxes (numpy.ndarray): (n, 4) array of the ``x, y, width, height`` of each object.
+        areas (numpy.ndarray): Number of pixels of each object.
+        centroids (numpy.ndarray): (n, 2) array of the ``x, y`` centroid of each object.
+    """
+
+    def __init__(self, labels, bboxes, areas, centroids):
+        self.labels = labels
+        self.bboxes = bboxes
+        self.areas = areas
+        self.centroids = centroids
+
+    def __len__(self):
+        return len(self.areas)
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+    def binary(self):
+        """uint8 mask of every object, 255 on the objects."""
+        return 255 * (self.labels > 0).astype(np.uint8)
+
+    def crop(self, k):
+        """uint8 mask of object ``k`` cropped to its bounding box."""
+        x, y, w, h = self.bboxes[k]
+        return 255 * (self.labels[y : y + h, x : x + w] == k + 1).astype(np.uint8)
+
+    def mask(self, k):
+        """Full-frame uint8 mask of object ``k``."""
+        return 255 * (self.labels == k + 1).astype(np.uint8)
+
+    def sparse(self, k):
+        """Full-frame mask of object ``k`` as a CSR matrix, built from its crop only."""
+        x, y, w, h = self.bboxes[k]
+        rows, cols = np.nonzero(self.labels[y : y + h, x : x + w] == k + 1)
+        data = np.full(len(rows), 255, dtype=np.uint8)
+        return csr_matrix((data, (rows + y, cols + x)), shape=self.shape)
+
+
+def label_objects(image, min_size=0, connectivity=8):
+    """Label the objects of a binary mask and drop those smaller than ``min_size``.
+
+    The size of an object is the area enclosed by its external contour, as
+    given by ``cv2.contourArea``, so the same objects are kept as when the
+    small contours were erased one by one. Only the small contours are drawn,
+    after which the bounding box, area and centroid of every object are
+    obtained from a single ``cv2.connectedComponentsWithStats`` call. The
+    area reported for an object is its number of pixels.
+
+    Args:
+        image (numpy.ndarray): uint8 mask, non-zero on the objects.
+        min_size (float): Objects whose external contour encloses a smaller
+            area are removed, with anything inside them.
+        connectivity (int): 4 or 8, as for OpenCV.
+
+    Returns:
+        FrameLabels: The labelled objects of the frame.
+    """
+    mask = (image > 0).astype(np.uint8)
+    if min_size > 0:
+        contours, _ = cv2.findContours(
+            mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        small = [c for c in contours if cv2.contourArea(c) < min_size]
+        if small:
+            cv2.drawContours(mask, small, -1, 0, -1)
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(
+        mask, connectivity=connectivity, ltype=cv2.CV_32S
+    )
+    return FrameLabels(
+        labels,
+        stats[1:, : cv2.CC_STAT_AREA].astype(np.int64),
+        stats[1:, cv2.CC_STAT_AREA].astype(np.int64),
+        centroids[1:],
+    )
+
+
+def save_labels(frame_labels, output_dir, name):
+    """Export the objects of a frame as cropped masks.
+
+    Each object is written as ``object_<k>.png`` cropped to its bounding box,
+    and ``objects.csv`` keeps the position, area and centroid of every object
+    together with the frame size.
+
+    Args:
+        frame_labels (FrameLabels): The objects of the frame.
+        output_dir (str): Folder in which the frame folder is created.
+        name (str): Name of the frame folder, e.g. 'heatmap_test_0'.
+
+    Returns:
+        int: Number of objects written.
+    """
+    image_dir = os.path.join(output_dir, name)
+    os.makedirs(image_dir, exist_ok=True)
+    height, width = frame_labels.shape
+    with open(os.path.join(image_dir, OBJECTS_CSV), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(OBJECTS_COLUMNS)
+        for k in range(len(frame_labels)):
+            cv2.imwrite(os.path.join(image_dir, f"object_{k}.png"), frame_labels.crop(k))
+            x, y, w, h = frame_labels.bboxes[k]
+            cx, cy = frame_labels.centroids[k]
+            writer.writerow(
+                [k, x, y, w, h, frame_labels.areas[k], cx, cy, height, width]
+            )
+    return len(frame_labels)
+
+
+def read_objects_csv(image_dir):
+    """Read the ``objects.csv`` of a frame folder written by :func:`save_labels`.
+
+    Returns:
+        dict: Row of every object, keyed by its file name, or None if the
+        folder holds full-frame objects without ``objects.csv``.
+    """
+    csv_path = os.path.join(image_dir, OBJECTS_CSV)
+    if not os.path.exists(csv_path):
+        return None
+    with open(csv_path, newline="") as file:
+        return {f"object_{row['object']}.png": row for row in csv.DictReader(file)}
+
+
+def uncrop(crop, row):
+    """Paste a cropped object mask back into a full frame, from its ``objects.csv`` row."""
+    x, y = int(row["x"]), int(row["y"])
+    h, w = crop.shape[:2]
+    frame = np.zeros(
+        (int(row["frame_height"]), int(row["frame_width"])), dtype=crop.dtype
+    )
+    frame[y : y + h, x : x + w] = crop
+    return frame
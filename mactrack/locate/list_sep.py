@@ -1,62 +1,133 @@
 import os
+import sys
 import cv2
-import numpy as np
-from scipy.sparse import csr_matrix
+from concurrent.futures import ThreadPoolExecutor
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from locate.labels import read_objects_csv
+from locate.objects import ObjectStore
+
+
+def frame_index(heatmap_test_name):
+    """Frame index of a 'heatmap_test_<i>' name."""
+    return int(heatmap_test_name.rsplit("_", 1)[1])
+
+
+def object_index(object_name):
+    """Object id of an 'object_<k>.png' name."""
+    return int(object_name.split("_", 1)[1].split(".")[0])
+
+
+class segmentation(ObjectStore):
+    """Objects found by ``locate`` in every frame.
+
+    This is an :class:`ObjectStore` keeping the historical interface, where
+    frames are named 'heatmap_test_<i>' and objects 'object_<k>.png', and
+    where objects are exchanged as full-frame CSR matrices.
+    """
 
-class segmentation:
     def __init__(self, root_folder):
+        super().__init__()
         self.root_folder = root_folder
-        self.images = []
-
-    def load_images(self):
-        for dir_name in os.listdir(self.root_folder):
-            dir_path = os.path.join(self.root_folder, dir_name)
-            if os.path.isdir(dir_path) and dir_name.startswith("heatmap_test_"):
-                objects_list = []
-                for file_name in os.listdir(dir_path):
-                    if file_name.endswith(".png") and file_name.startswith("object_"):
-                        file_path = os.path.join(dir_path, file_name)
-                        image = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
-                        print(file_path)
-                        if image is not None:
-                            sparse_image = csr_matrix(image)
-                            objects_list.append((file_name, sparse_image))
-                self.images.append((dir_name, objects_list))
+
+    @property
+    def images(self):
+        """Objects as a list of ``(dir_name, [(file_name, sparse_image)])``, built on demand."""
+        return [
+            (
+                f"heatmap_test_{frame}",
+                [
+                    (f"object_{obj}.png", self.sparse(frame, obj))
+                    for obj in self.objects(frame)
+                ],
+            )
+            for frame in self.frames()
+        ]
+
+    def _read_frame(self, dir_name):
+        dir_path = os.path.join(self.root_folder, dir_name)
+        # Frames exported by save_labels hold cropped objects
+        rows = read_objects_csv(dir_path)
+        shape = None
+        objects = []
+        file_names = [
+            f
+            for f in os.listdir(dir_path)
+            if f.endswith(".png") and f.startswith("object_")
+        ]
+        for file_name in sorted(file_names, key=object_index):
+            image = cv2.imread(os.path.join(dir_path, file_name), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            offset = (0, 0)
+            if rows is not None:
+                row = rows[file_name]
+                shape = (int(row["frame_height"]), int(row["frame_width"]))
+                offset = (int(row["x"]), int(row["y"]))
+            else:
+                shape = image.shape
+            objects.append((object_index(file_name), image, offset))
+        return frame_index(dir_name), shape, objects
+
+    def load_images(self, workers=None, archive=None):
+        """Load the objects exported to ``root_folder``.
+
+        The frame folders are read concurrently by a thread pool and added in
+        frame order. Alternatively, a single archive written by
+        :meth:`save_archive` can be read instead of the PNG files.
+
+        Args:
+            workers (int, optional): Number of reading threads. Defaults to
+                the ThreadPoolExecutor default.
+            archive (str, optional): Path to an ``.npz`` archive of the objects.
+        """
+        if archive is not None:
+            self.load_archive(archive)
+            return
+
+        dir_names = [
+            d
+            for d in os.listdir(self.root_folder)
+            if d.startswith("heatmap_test_")
+            and os.path.isdir(os.path.join(self.root_folder, d))
+        ]
+        dir_names.sort(key=frame_index)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for frame, shape, objects in executor.map(self._read_frame, dir_names):
+                if self.shape is None:
+                    self.shape = shape
+                self.add_frame_objects(frame)
+                for obj, image, offset in objects:
+                    self.add(frame, obj, image, offset)
+
+    def add_frame(self, heatmap_test_name, frame_labels):
+        """Store the labelled objects of a frame, named ``object_0.png``, ``object_1.png``..."""
+        self.set_frame(frame_index(heatmap_test_name), frame_labels)
 
     def get_image(self, heatmap_test_name, object_name):
-        for dir_name, objects_list in self.images:
-            if dir_name == heatmap_test_name:
-                for file_name, sparse_image in objects_list:
-                    if file_name == object_name:
-                        return sparse_image
+        key = (frame_index(heatmap_test_name), object_index(object_name))
+        if key in self:
+            return self.sparse(*key)
 
     def get_list(self, heatmap_test_name):
-        for dir_name, objects_list in self.images:
-            if dir_name == heatmap_test_name:
-                return [sparse_image for _, sparse_image in objects_list]
-        return None
+        frame = frame_index(heatmap_test_name)
+        objects = self.objects(frame)
+        if objects is None:
+            return None
+        return [self.sparse(frame, obj) for obj in objects]
 
     def add_image(self, heatmap_test_name, object_name, image):
         if image is None:
             print(f"Failed to load image")
             return
-        sparse_image = csr_matrix(image)
-
-        for dir_name, objects_list in self.images:
-            if dir_name == heatmap_test_name:
-                objects_list.append((object_name, sparse_image))
-                return
+        frame = frame_index(heatmap_test_name)
+        if self.objects(frame) is not None:
+            self.add(frame, object_index(object_name), image)
 
     def replace_image(self, heatmap_test_name, object_name, new_image):
         if new_image is None:
             print(f"Failed to load new image")
             return
-        new_sparse_image = csr_matrix(new_image)
-
-        for dir_name, objects_list in self.images:
-            if dir_name == heatmap_test_name:
-                for i, (file_name, _) in enumerate(objects_list):
-                    if file_name == object_name:
-                        objects_list[i] = (object_name, new_sparse_image)
-                        return
+        key = (frame_index(heatmap_test_name), object_index(object_name))
+        if key in self:
+            self.add(*key, new_image)
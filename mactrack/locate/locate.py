@@ -1,108 +1,228 @@
 import os
 import cv2
 import numpy as np
-import shutil
-import inspect
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from kartezio.inference import ModelPool
 from kartezio.fitness import FitnessIOU
 from kartezio.dataset import read_dataset
-from numena.image.basics import image_normalize
+from numena.image.basics import image_normalize, image_split
+from numena.image.color import bgr2hsv
 import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 from locate.temp_dataset import create_temporary_dataset
+from locate.labels import label_objects, save_labels
+from pipeline.context import run_context
 
 
 def filter_small_shapes(image, min_size):
-    contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return label_objects(image, min_size).binary()
 
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area < min_size:
-            cv2.drawContours(image, [contour], 0, 0, -1)
 
-    return image
+def extract_objects(image, output_dir, filename):
+    return save_labels(label_objects(image), output_dir, filename.split(".")[0])
 
 
-def extract_objects(image, output_dir, filename):
-    contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    image_dir = os.path.join(output_dir, filename.split(".")[0])
-    os.makedirs(image_dir, exist_ok=True)
-    object_count = 0
+def heatmap_to_objects(heatmap_cp, min_shape_size=100):
+    """Threshold an ensemble heatmap, remove its small shapes and label its objects.
 
-    for i, contour in enumerate(contours):
-        mask = np.zeros_like(image)
-        cv2.drawContours(mask, [contour], 0, (255), -1)
-        object_image = cv2.bitwise_and(image, image, mask=mask)
-        cv2.imwrite(os.path.join(image_dir, f"object_{i}.png"), object_image)
-        object_count += 1
+    Args:
+        heatmap_cp (numpy.ndarray): uint8 heatmap of a frame.
+        min_shape_size (int): Objects enclosing a smaller contour area are removed.
 
-    return object_count
+    Returns:
+        tuple: The binary mask of the frame and its :class:`FrameLabels`.
+    """
+    frame_labels = label_objects(heatmap_cp > 0, min_shape_size)
+    return frame_labels.binary(), frame_labels
 
 
-def locate(input_folder):
-    caller_frame = inspect.stack()[1]
-    caller_file = caller_frame.filename
-    caller_dir = os.path.dirname(os.path.abspath(caller_file))
-    output_dir = os.path.join(caller_dir, r"output")
+def frame_to_input(frame):
+    """Convert a BGR frame to the HSV channel list kartezio's dataset reader produces.
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    Args:
+        frame (numpy.ndarray): BGR frame, as decoded by OpenCV.
 
-    output_dir_masks = os.path.join(output_dir, "masks")
-    if not os.path.exists(output_dir_masks):
-        os.makedirs(output_dir_masks)
+    Returns:
+        list: The H, S and V channels of the frame.
+    """
+    return image_split(bgr2hsv(frame))
 
-    # Number of frames in video
-    n = len(os.listdir(os.path.join(input_folder, "dataset", "test", "test_x")))
 
+def _load_ensemble(models_path):
     fitness = FitnessIOU()
-    ensemble = ModelPool(
-        os.path.join(input_folder, r"models"), fitness, regex="*/elite.json"
-    ).to_ensemble()
-    dataset = read_dataset(os.path.join(input_folder, r"dataset"), counting=True)
-    p_test = ensemble.predict(dataset.test_x)
+    return ModelPool(models_path, fitness, regex="*/elite.json").to_ensemble()
 
-    for i in range(n):
-        mask_list = [image_normalize(pi[0][i]["mask"]) for pi in p_test]
-        heatmap = np.array(mask_list).mean(axis=0)
-        heatmap_cp = (heatmap * 255.0).astype(np.uint8)
 
-        cv2.imwrite(os.path.join(output_dir_masks, f"heatmap_test_{i}.png"), heatmap_cp)
+def _heatmap(p_test, i):
+    mask_list = [image_normalize(pi[0][i]["mask"]) for pi in p_test]
+    heatmap = np.array(mask_list).mean(axis=0)
+    return (heatmap * 255.0).astype(np.uint8)
 
-    input_dir_masks = os.path.join(output_dir, "masks")
-    output_dir_masks2 = os.path.join(output_dir, "list_comp")
-    if not os.path.exists(output_dir_masks2):
-        os.makedirs(output_dir_masks2)
 
-    file_list = os.listdir(input_dir_masks)
-    min_shape_size = 100
+_worker_ensemble = None
 
-    for filename in file_list:
-        input_path = os.path.join(input_dir_masks, filename)
-        image = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
 
-        colored_image = 255 * (image > 0).astype("uint8")
-        colored_image = filter_small_shapes(colored_image, min_shape_size)
-        output_path = os.path.join(output_dir_masks2, filename)
+def _init_worker(models_path):
+    global _worker_ensemble
+    _worker_ensemble = _load_ensemble(models_path)
 
-        cv2.imwrite(output_path, colored_image)
 
-    shutil.rmtree(output_dir_masks)
+def _predict_window(test_x):
+    """Run every model of the worker's ensemble on a window of frames and average them."""
+    p_test = _worker_ensemble.predict(test_x)
+    return [_heatmap(p_test, i) for i in range(len(test_x))]
 
-    input_dir_masks2 = output_dir_masks2
-    output_dir_list = os.path.join(output_dir, "list_sep")
-    if not os.path.exists(output_dir_list):
-        os.makedirs(output_dir_list)
 
-    file_list = os.listdir(input_dir_masks2)
+def _input_frames(input_folder, source):
+    if source is not None:
+        for _, frame, _ in source:
+            yield frame_to_input(frame)
+        return
+    # Same order as the dataset.csv written by create_dataset_csv
+    test_x_folder = os.path.join(input_folder, "dataset", "test", "test_x")
+    for file in sorted(os.listdir(test_x_folder)):
+        if file.endswith((".png", ".jpg")):
+            yield frame_to_input(cv2.imread(os.path.join(test_x_folder, file)))
+
+
+def _windows(frames, chunk_size):
+    window = []
+    for frame in frames:
+        window.append(frame)
+        if len(window) == chunk_size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def chunked_heatmaps(frames, models_path, chunk_size=16, workers=1):
+    """Average the ensemble masks window by window, in frame order.
+
+    Only the masks of the windows being processed are held in memory, so the
+    peak memory is bounded by ``chunk_size`` x number of models (per worker)
+    instead of the length of the video.
+
+    Args:
+        frames (iterable): Inputs of the ensemble, as returned by ``frame_to_input``.
+        models_path (str): Path to the 'models' folder of the ensemble.
+        chunk_size (int): Number of frames per window.
+        workers (int): Number of worker processes. With 1, everything runs in
+            the current process.
+
+    Yields:
+        numpy.ndarray: The uint8 heatmap of each frame.
+    """
+    if workers <= 1:
+        _init_worker(models_path)
+        for window in _windows(frames, chunk_size):
+            yield from _predict_window(window)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(models_path,)
+    ) as executor:
+        # Keep a bounded number of windows in flight, and yield them in order
+        pending = deque()
+        for window in _windows(frames, chunk_size):
+            pending.append(executor.submit(_predict_window, window))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def locate(
+    input_folder,
+    source=None,
+    chunk_size=None,
+    workers=1,
+    image_storage=None,
+    export=None,
+    min_shape_size=100,
+    context=None,
+):
+    """Segment every frame of the red channel video with the kartezio ensemble.
+
+    By default, the frames are read from ``dataset/test/test_x`` through
+    kartezio's ``read_dataset``. A :class:`FrameSource` can be given instead to
+    consume the decoded frames directly, in which case nothing has to be
+    written to the dataset folder.
+
+    Each heatmap is thresholded, filtered and split into objects in memory.
+    The binary masks and the objects, cropped to their bounding box, are
+    exported to 'list_comp' and 'list_sep' in the output root unless
+    ``export`` is False, and are added to
+    ``image_storage`` when a :class:`segmentation` is given, so it does not
+    have to reload them.
+
+    Args:
+        input_folder (str): Path to the input folder, containing the 'models' folder.
+        source (FrameSource, optional): Stream of (index, red, green) frames.
+        chunk_size (int, optional): If given, the frames are segmented by
+            windows of this size, see :func:`chunked_heatmaps`.
+        workers (int): Number of worker processes used for the chunked inference.
+        image_storage (segmentation, optional): Storage filled with the objects.
+        export (bool, optional): Whether to write 'list_comp' and 'list_sep'.
+            Defaults to the backend of the context.
+        min_shape_size (int): Objects enclosing a smaller contour area are removed.
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+
+    Returns:
+        list: p_test, the predictions of every model of the ensemble, or None
+        with the chunked inference, as they are not kept.
+    """
+    context = run_context(context)
+    output_dir = context.output_root
+    if export is None:
+        export = context.export
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    models_path = os.path.join(input_folder, r"models")
+    if chunk_size is None and workers <= 1:
+        ensemble = _load_ensemble(models_path)
+        if source is None:
+            # Number of frames in video
+            n = len(os.listdir(os.path.join(input_folder, "dataset", "test", "test_x")))
+            dataset = read_dataset(
+                os.path.join(input_folder, r"dataset"), counting=True
+            )
+            test_x = dataset.test_x
+        else:
+            test_x = [frame_to_input(frame) for _, frame, _ in source]
+            n = len(test_x)
+        p_test = ensemble.predict(test_x)
+        heatmaps = (_heatmap(p_test, i) for i in range(n))
+    else:
+        p_test = None
+        heatmaps = chunked_heatmaps(
+            _input_frames(input_folder, source),
+            models_path,
+            chunk_size=chunk_size or 16,
+            workers=workers,
+        )
+
+    if export:
+        output_dir_masks2 = os.path.join(output_dir, "list_comp")
+        output_dir_list = os.path.join(output_dir, "list_sep")
+        os.makedirs(output_dir_masks2, exist_ok=True)
+        os.makedirs(output_dir_list, exist_ok=True)
+
     image_objects_count = {}
 
-    for filename in file_list:
-        input_path = os.path.join(input_dir_masks2, filename)
-        image = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
-        object_count = extract_objects(image, output_dir_list, filename)
-        image_objects_count[filename] = object_count
+    for i, heatmap_cp in enumerate(heatmaps):
+        filename = f"heatmap_test_{i}.png"
+        colored_image, objects = heatmap_to_objects(heatmap_cp, min_shape_size)
+        if export:
+            cv2.imwrite(os.path.join(output_dir_masks2, filename), colored_image)
+            save_labels(objects, output_dir_list, filename.split(".")[0])
+        if image_storage is not None:
+            image_storage.add_frame(filename.split(".")[0], objects)
+        image_objects_count[filename] = len(objects)
 
     with open(os.path.join(output_dir, "summary.txt"), "w") as summary_file:
         for filename, count in image_objects_count.items():
@@ -111,22 +231,20 @@ def locate(input_folder):
     return p_test
 
 
-def locate_frame(input_image_path, model_path, output_name):
+def locate_frame(input_image_path, model_path, output_name, context=None):
     """Same function as `locate` but for a single frame. Used for model building or to test the performences of the model.
 
     Args:
         input_image_path (str): Path to the input image.
         model_path (str): Path to the model you want to use. Should contain a 'models' folder with the model in it and a dataset folder with the dataset used to train the model.
-        output_name (str): Name of the output folder where the results will be saved.
+        output_name (str): Name of the output folder where the results will be saved, in the output root.
+        context (RunContext, optional): Output root and scratch folder of the run. Defaults to './output'.
 
     Returns:
         list: p_test, the prediction on the input frame
     """
-    caller_frame = inspect.stack()[-1]
-    caller_file = caller_frame.filename
-    caller_dir = os.path.dirname(os.path.abspath(caller_file))
-
-    output_dir = os.path.join(caller_dir, output_name)
+    context = run_context(context)
+    output_dir = context.path(output_name)
     if not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
@@ -134,20 +252,13 @@ def locate_frame(input_image_path, model_path, output_name):
     if not os.path.exists(output_dir_masks):
         os.makedirs(output_dir_masks)
 
-    fitness = FitnessIOU()
-    ensemble = ModelPool(
-        os.path.join(model_path, r"models"),
-        fitness,
-        regex="*/elite.json",
-    ).to_ensemble()
-    create_temporary_dataset(input_image_path, model_path)
-    dataset = read_dataset(os.path.join(caller_dir, r"temp_dataset"), counting=True)
+    ensemble = _load_ensemble(os.path.join(model_path, r"models"))
+    temp_dataset_dir = create_temporary_dataset(input_image_path, model_path, context)
+    dataset = read_dataset(temp_dataset_dir, counting=True)
 
     p_test = ensemble.predict(dataset.test_x)
 
-    mask_list = [image_normalize(pi[0][0]["mask"]) for pi in p_test]
-    heatmap = np.array(mask_list).mean(axis=0)
-    heatmap_cp = (heatmap * 255.0).astype(np.uint8)
+    heatmap_cp = _heatmap(p_test, 0)
 
     heatmap_filename = os.path.basename(input_image_path).split(".")[0] + "_heatmap.png"
     cv2.imwrite(os.path.join(output_dir_masks, heatmap_filename), heatmap_cp)
@@ -156,11 +267,7 @@ def locate_frame(input_image_path, model_path, output_name):
     if not os.path.exists(output_dir_masks2):
         os.makedirs(output_dir_masks2)
 
-    min_shape_size = 100
-    input_path = os.path.join(output_dir_masks, heatmap_filename)
-    img = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
-    colored_image = 255 * (img > 0).astype("uint8")
-    colored_image = filter_small_shapes(colored_image, min_shape_size)
+    colored_image, objects = heatmap_to_objects(heatmap_cp)
     output_path = os.path.join(output_dir_masks2, heatmap_filename)
     cv2.imwrite(output_path, colored_image)
 
@@ -168,7 +275,9 @@ def locate_frame(input_image_path, model_path, output_name):
     if not os.path.exists(output_dir_list):
         os.makedirs(output_dir_list)
 
-    object_count = extract_objects(colored_image, output_dir_list, heatmap_filename)
+    object_count = save_labels(
+        objects, output_dir_list, heatmap_filename.split(".")[0]
+    )
 
     with open(os.path.join(output_dir, "summary.txt"), "a") as summary_file:
         summary_file.write(f"{heatmap_filename} : {object_count} objets\n")
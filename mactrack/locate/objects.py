@@ -0,0 +1,304 @@
+import os
+import re
+import cv2
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+
+class ObjectStore:
+    """Objects of every frame of a video, indexed by (frame, object id).
+
+    Each object is kept as a bit-packed boolean mask cropped to its bounding
+    box, so its memory is proportional to its size rather than to the frame
+    size. Lookups, insertions and replacements are O(1) dictionary
+    operations. The bounding boxes, areas and centroids of a frame are also
+    available as contiguous arrays through :meth:`frame_table`.
+
+    Args:
+        shape (tuple, optional): (height, width) of the frames. Set from the
+            first full-frame mask added if not given.
+    """
+
+    def __init__(self, shape=None):
+        self.shape = shape
+        self._frames = {}
+        self._tables = {}
+
+    @staticmethod
+    def _pack(mask, x, y):
+        """Crop a boolean mask to its pixels and pack it, with its offset in the frame."""
+        rows, cols = np.nonzero(mask)
+        if len(rows) == 0:
+            return (x, y, 0, 0, np.zeros(0, dtype=np.uint8), 0, (np.nan, np.nan))
+        top, left = rows.min(), cols.min()
+        h, w = rows.max() - top + 1, cols.max() - left + 1
+        crop = mask[top : top + h, left : left + w]
+        centroid = (cols.mean() + x, rows.mean() + y)
+        return (
+            int(x + left),
+            int(y + top),
+            int(w),
+            int(h),
+            np.packbits(crop, axis=None),
+            len(rows),
+            centroid,
+        )
+
+    def _record(self, image, offset=(0, 0)):
+        if issparse(image):
+            image = image.tocoo()
+            if self.shape is None:
+                self.shape = image.shape
+            keep = image.data > 127
+            rows, cols = image.row[keep], image.col[keep]
+            if len(rows) == 0:
+                return self._pack(np.zeros((0, 0), dtype=bool), 0, 0)
+            top, left = rows.min(), cols.min()
+            mask = np.zeros((rows.max() - top + 1, cols.max() - left + 1), dtype=bool)
+            mask[rows - top, cols - left] = True
+            return self._pack(mask, left, top)
+        image = np.asarray(image)
+        if image.ndim == 3:
+            image = image[:, :, 0]
+        if self.shape is None and offset == (0, 0):
+            self.shape = image.shape
+        return self._pack(image > 127, offset[0], offset[1])
+
+    def add_frame_objects(self, frame):
+        """Make sure ``frame`` exists, even without any object, and return its objects."""
+        return self._frames.setdefault(frame, {})
+
+    def add(self, frame, obj, image, offset=(0, 0)):
+        """Store (or replace) an object.
+
+        Args:
+            frame (int): Frame index.
+            obj (int): Object id within the frame.
+            image: Full-frame mask (dense or sparse), or a crop placed at ``offset``.
+            offset (tuple): (x, y) position of ``image`` in the frame.
+        """
+        self.add_frame_objects(frame)[obj] = self._record(image, offset)
+        self._tables.pop(frame, None)
+
+    def set_frame(self, frame, frame_labels):
+        """Store every object of a :class:`FrameLabels`, with ids 0..n-1."""
+        if self.shape is None:
+            self.shape = frame_labels.shape
+        objects = self._frames[frame] = {}
+        for k in range(len(frame_labels)):
+            x, y, w, h = frame_labels.bboxes[k]
+            objects[k] = self._pack(frame_labels.crop(k) > 0, x, y)
+        self._tables.pop(frame, None)
+
+    def remove(self, frame, obj):
+        del self._frames[frame][obj]
+        self._tables.pop(frame, None)
+
+    def __contains__(self, key):
+        frame, obj = key
+        return frame in self._frames and obj in self._frames[frame]
+
+    def frames(self):
+        """Indices of the stored frames, in increasing order."""
+        return sorted(self._frames)
+
+    def objects(self, frame):
+        """Ids of the objects of ``frame``, in insertion order, or None for an unknown frame."""
+        if frame not in self._frames:
+            return None
+        return list(self._frames[frame])
+
+    def bbox(self, frame, obj):
+        """(x, y, width, height) of an object."""
+        return self._frames[frame][obj][:4]
+
+    def mask(self, frame, obj):
+        """Boolean mask of an object, cropped to its bounding box."""
+        x, y, w, h, packed, _, _ = self._frames[frame][obj]
+        return np.unpackbits(packed, count=w * h).reshape(h, w).astype(bool)
+
+    def dense(self, frame, obj):
+        """Full-frame uint8 mask of an object, 255 on the object."""
+        x, y, w, h = self.bbox(frame, obj)
+        image = np.zeros(self.shape, dtype=np.uint8)
+        image[y : y + h, x : x + w][self.mask(frame, obj)] = 255
+        return image
+
+    def sparse(self, frame, obj):
+        """Full-frame mask of an object as a CSR matrix, 255 on the object."""
+        x, y, w, h = self.bbox(frame, obj)
+        rows, cols = np.nonzero(self.mask(frame, obj))
+        data = np.full(len(rows), 255, dtype=np.uint8)
+        return csr_matrix((data, (rows + y, cols + x)), shape=self.shape)
+
+    def frame_table(self, frame):
+        """Contiguous arrays describing the objects of a frame.
+
+        Returns:
+            dict: ``ids`` (n,), ``bboxes`` (n, 4) as x, y, width, height,
+            ``areas`` (n,) in pixels and ``centroids`` (n, 2) as x, y.
+        """
+        if frame not in self._tables:
+            records = self._frames.get(frame, {})
+            self._tables[frame] = {
+                "ids": np.array(list(records), dtype=np.int64),
+                "bboxes": np.array(
+                    [r[:4] for r in records.values()], dtype=np.int64
+                ).reshape(-1, 4),
+                "areas": np.array([r[5] for r in records.values()], dtype=np.int64),
+                "centroids": np.array(
+                    [r[6] for r in records.values()], dtype=np.float64
+                ).reshape(-1, 2),
+            }
+        return self._tables[frame]
+
+    def label_image(self, frame):
+        """int32 label image of a frame, ``r + 1`` on the pixels of the object of row ``r`` of :meth:`frame_table`.
+
+        Objects are assumed not to overlap: where they do, the last one wins.
+        """
+        labels = np.zeros(self.shape, dtype=np.int32)
+        for r, obj in enumerate(self.frame_table(frame)["ids"].tolist()):
+            x, y, w, h = self.bbox(frame, obj)
+            labels[y : y + h, x : x + w][self.mask(frame, obj)] = r + 1
+        return labels
+
+    def save_archive(self, path):
+        """Write every object to a single compressed ``.npz`` archive.
+
+        Args:
+            path (str): Path of the archive.
+        """
+        keys, records = [], []
+        for frame in self.frames():
+            for obj, record in self._frames[frame].items():
+                keys.append((frame, obj))
+                records.append(record)
+        packed = [r[4] for r in records]
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        np.savez_compressed(
+            path,
+            shape=np.array(self.shape if self.shape is not None else (0, 0)),
+            frames=np.array(self.frames(), dtype=np.int64),
+            keys=np.array(keys, dtype=np.int64).reshape(-1, 2),
+            bboxes=np.array([r[:4] for r in records], dtype=np.int64).reshape(-1, 4),
+            areas=np.array([r[5] for r in records], dtype=np.int64),
+            centroids=np.array([r[6] for r in records], dtype=np.float64).reshape(
+                -1, 2
+            ),
+            offsets=np.cumsum([0] + [len(p) for p in packed]),
+            packed=np.concatenate(packed) if packed else np.zeros(0, np.uint8),
+        )
+
+    def load_archive(self, path):
+        """Add the objects of an archive written by :meth:`save_archive`."""
+        with np.load(path) as archive:
+            # Each access to an npz member reads it again, so read them once
+            data = {name: archive[name] for name in archive.files}
+        if self.shape is None and data["shape"].any():
+            self.shape = tuple(int(v) for v in data["shape"])
+        for frame in data["frames"]:
+            self.add_frame_objects(int(frame))
+        offsets, packed = data["offsets"], data["packed"]
+        for i, (frame, obj) in enumerate(data["keys"].tolist()):
+            x, y, w, h = data["bboxes"][i].tolist()
+            self._frames[frame][obj] = (
+                x,
+                y,
+                w,
+                h,
+                packed[offsets[i] : offsets[i + 1]],
+                int(data["areas"][i]),
+                tuple(data["centroids"][i].tolist()),
+            )
+        self._tables.clear()
+
+
+def object_contours(image):
+    """External contours of a thresholded object mask.
+
+    Args:
+        image (numpy.ndarray): Grayscale or BGR mask, the object above 127.
+
+    Returns:
+        tuple: The contours, as returned by ``cv2.findContours``.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(image, 127, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return contours
+
+
+def folder_objects(base_folder):
+    """Index the object files of the track folders by frame.
+
+    Args:
+        base_folder (str): Folder of the ``macrophage_<id>`` track folders,
+            holding one ``<frame>_<object>.png`` mask per tracked object.
+
+    Returns:
+        dict: Frame -> list of (track id, object id, path of the mask).
+    """
+    objects = {}
+    for folder in os.listdir(base_folder):
+        folder_path = os.path.join(base_folder, folder)
+        if not (os.path.isdir(folder_path) and folder.startswith("macrophage_")):
+            continue
+        track_id = int(re.findall(r"\d+", folder)[0])
+        for file in os.listdir(folder_path):
+            match = re.match(r"(\d+)_(\d+)\.png", file)
+            if match:
+                objects.setdefault(int(match.group(1)), []).append(
+                    (track_id, int(match.group(2)), os.path.join(folder_path, file))
+                )
+    return objects
+
+
+def table_objects(tracks):
+    """Index the objects of a :class:`TrackTable` by frame.
+
+    Args:
+        tracks (TrackTable): The tracks.
+
+    Returns:
+        dict: Frame -> list of (track id, object id, None), in the layout of
+        :func:`folder_objects`, the masks being in an :class:`ObjectStore`.
+    """
+    objects = {}
+    for track_id in tracks:
+        for a, obj in tracks.tracks[track_id]:
+            objects.setdefault(a, []).append((track_id, obj, None))
+    return objects
+
+
+def stored_contours(image_storage, a, obj):
+    """Contours of an object of an :class:`ObjectStore`, in frame coordinates.
+
+    The contours are found on the crop of the object, padded by one pixel so
+    that objects touching the edge of their bounding box stay closed.
+
+    Args:
+        image_storage (ObjectStore): The objects.
+        a (int): Frame index.
+        obj (int): Object id within the frame.
+
+    Returns:
+        tuple: The contours, as returned by ``cv2.findContours``.
+    """
+    x, y, w, h = image_storage.bbox(a, obj)
+    crop = cv2.copyMakeBorder(
+        image_storage.mask(a, obj).astype(np.uint8) * 255,
+        1,
+        1,
+        1,
+        1,
+        cv2.BORDER_CONSTANT,
+        value=0,
+    )
+    contours, _ = cv2.findContours(
+        crop, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x - 1, y - 1)
+    )
+    return contours
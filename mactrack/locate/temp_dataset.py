@@ -1,5 +1,4 @@
 import os
-import inspect
 import shutil
 import sys
 
@@ -7,21 +6,23 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"
 from Set_up.empty_zip import empty_dataset_testy_zip_single_frame
 from Set_up.dataset_csv import create_dataset_csv, create_meta_file
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from pipeline.context import run_context
 
-def create_temporary_dataset(imput_image_path, model_path):
+
+def create_temporary_dataset(imput_image_path, model_path, context=None):
     """Creates a temporary dataset for structural purposes in the execution of the locate_frame function.
 
     Args:
         imput_image_path (str): Path to the input image.
         model_path (str): Path to the model you want to use. Should contain a 'models' folder with the model in it and a dataset folder with the dataset used to train the model.
-    """
-    # Automatically determine the directory of the caller
-    caller_frame = inspect.stack()[-1]
-    caller_file = caller_frame.filename
-    caller_dir = os.path.dirname(os.path.abspath(caller_file))
+        context (RunContext, optional): The dataset is created in its scratch folder. Defaults to './output/scratch'.
 
-    # Create the temp_dataset directory in the caller's directory
-    temp_dataset_dir = os.path.join(caller_dir, "temp_dataset")
+    Returns:
+        str: Path to the temporary dataset.
+    """
+    # Create the temp_dataset directory in the scratch folder of the run
+    temp_dataset_dir = run_context(context).scratch("temp_dataset")
     if not os.path.exists(temp_dataset_dir):
         os.makedirs(temp_dataset_dir)
     else:
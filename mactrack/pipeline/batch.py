@@ -0,0 +1,119 @@
+import os
+import sys
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from pipeline.context import RunContext
+from pipeline.runner import mactrack_pipeline
+from analyse.tabglobal import tabglobal
+
+# Parameters of mactrack_pipeline that a manifest can set, with their type
+PARAMETERS = {
+    "threshold_iou": float,
+    "p": int,
+    "min_shape_size": int,
+    "mode": str,
+    "split": str,
+    "chunk_size": int,
+    "workers": int,
+}
+
+
+def read_manifest(path):
+    """Read the experiments of a batch from a CSV or JSON manifest.
+
+    Each experiment has a ``name``, an ``input_folder`` (relative to the
+    manifest, or absolute) and optionally any of the ``PARAMETERS`` of
+    :func:`pipeline.runner.mactrack_pipeline`. A CSV manifest has one column
+    per field, and a JSON manifest is a list of objects.
+
+    Args:
+        path (str): Path to the ``.csv`` or ``.json`` manifest.
+
+    Returns:
+        list: One dict per experiment, with ``name``, ``input_folder`` and ``params``.
+    """
+    with open(path, newline="") as file:
+        if path.endswith(".json"):
+            rows = json.load(file)
+        else:
+            rows = list(csv.DictReader(file))
+
+    folder = os.path.dirname(os.path.abspath(path))
+    experiments = []
+    for row in rows:
+        params = {
+            key: cast(row[key])
+            for key, cast in PARAMETERS.items()
+            if row.get(key) not in (None, "")
+        }
+        experiments.append(
+            {
+                "name": row["name"],
+                "input_folder": os.path.join(folder, row["input_folder"]),
+                "params": params,
+            }
+        )
+    names = [experiment["name"] for experiment in experiments]
+    if len(set(names)) != len(names):
+        raise ValueError("Experiment names must be unique in the manifest.")
+    return experiments
+
+
+def run_experiment(experiment, output_root):
+    """Run the pipeline of one experiment in its own folder ``<output_root>/<name>``.
+
+    The stages write to ``<output_root>/<name>/output``, given to them with a
+    :class:`RunContext`, so the experiments never write to the same paths.
+
+    Returns:
+        str: Name of the experiment.
+    """
+    root = os.path.join(output_root, experiment["name"])
+    os.makedirs(root, exist_ok=True)
+    context = RunContext(output_root=os.path.join(root, "output"))
+    mactrack_pipeline(
+        experiment["input_folder"], context=context, **experiment["params"]
+    ).run()
+    return experiment["name"]
+
+
+def run_batch(manifest, output_root="batch", workers=None):
+    """Process every experiment of a manifest in parallel, then summarize them.
+
+    Each experiment runs in a worker process, in its own output root, and
+    :func:`analyse.tabglobal.tabglobal` then summarizes all the experiments
+    into ``<output_root>/results_summary.xlsx``. An experiment that fails is
+    reported and left out of the summary.
+
+    Args:
+        manifest (str or list): Path to the manifest, or the experiments as
+            returned by :func:`read_manifest`.
+        output_root (str): Folder of the experiments' output folders.
+        workers (int, optional): Number of worker processes. Defaults to the
+            number of CPUs.
+
+    Returns:
+        pandas.DataFrame: The summary returned by ``tabglobal``.
+    """
+    if isinstance(manifest, str):
+        manifest = read_manifest(manifest)
+    output_root = os.path.abspath(output_root)
+    os.makedirs(output_root, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_experiment, experiment, output_root): experiment
+            for experiment in manifest
+        }
+        for future in as_completed(futures):
+            name = futures[future]["name"]
+            try:
+                future.result()
+                print(f"Expérience terminée : {name}")
+            except Exception as error:
+                print(f"Erreur pour l'expérience {name} : {error}")
+
+    return tabglobal(output_root, summary_folder=output_root)
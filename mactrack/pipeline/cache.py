@@ -0,0 +1,136 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+
+# File of the memoized input hashes, in the cache folder
+HASH_INDEX = "hashes.json"
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of the content of a file, read by chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_key(name, params=None, inputs=(), upstream=(), hash_file=file_hash):
+    """Content address of a stage run.
+
+    Args:
+        name (str): Name of the stage.
+        params (dict, optional): Parameters of the stage, JSON serializable.
+        inputs (list): Paths of the input files, hashed by content.
+        upstream (list): Keys of the stages it depends on.
+        hash_file (callable): Content hash of a file, e.g. the memoized
+            :meth:`StageCache.file_hash`.
+
+    Returns:
+        str: SHA-256 of the stage, its parameters, its inputs and its upstream keys.
+    """
+    description = {
+        "stage": name,
+        "params": params or {},
+        "inputs": sorted(hash_file(path) for path in inputs),
+        "upstream": list(upstream),
+    }
+    return hashlib.sha256(
+        json.dumps(description, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _copy(source, destination):
+    if os.path.isdir(destination):
+        shutil.rmtree(destination)
+    elif os.path.exists(destination):
+        os.remove(destination)
+    folder = os.path.dirname(destination)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    if os.path.isdir(source):
+        shutil.copytree(source, destination)
+    else:
+        shutil.copy2(source, destination)
+
+
+class StageCache:
+    """Results of the pipeline stages, stored by stage name and key.
+
+    An entry holds the pickled value returned by the stage and a copy of the
+    files and folders it wrote, restored in place on a cache hit. The hashes
+    of the input files are kept in ``hashes.json``, so an unchanged file is
+    not read again.
+
+    Args:
+        cache_dir (str): Folder of the cache.
+    """
+
+    def __init__(self, cache_dir="output/.cache"):
+        self.cache_dir = cache_dir
+        self._hashes = None
+
+    def _hash_index(self):
+        if self._hashes is None:
+            self._hashes = {}
+            path = os.path.join(self.cache_dir, HASH_INDEX)
+            if os.path.exists(path):
+                try:
+                    with open(path) as file:
+                        self._hashes = json.load(file)
+                except ValueError:
+                    pass
+        return self._hashes
+
+    def file_hash(self, path):
+        """:func:`file_hash` of a file, computed again only if its size or mtime changed."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        hashes = self._hash_index()
+        known = hashes.get(path)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        digest = file_hash(path)
+        hashes[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Replaced at once, so concurrent runs never read a partial index
+        partial = os.path.join(self.cache_dir, f"{HASH_INDEX}.{os.getpid()}")
+        with open(partial, "w") as file:
+            json.dump(hashes, file)
+        os.replace(partial, os.path.join(self.cache_dir, HASH_INDEX))
+        return digest
+
+    def entry(self, name, key):
+        return os.path.join(self.cache_dir, name, key)
+
+    def __contains__(self, name_key):
+        return os.path.exists(os.path.join(self.entry(*name_key), "value.pkl"))
+
+    def load(self, name, key, outputs=()):
+        """Restore the outputs of an entry and return its value."""
+        entry = self.entry(name, key)
+        for i, output in enumerate(outputs):
+            cached = os.path.join(entry, "files", str(i))
+            if os.path.exists(cached):
+                _copy(cached, output)
+        with open(os.path.join(entry, "value.pkl"), "rb") as file:
+            return pickle.load(file)
+
+    def store(self, name, key, value, outputs=()):
+        """Save the value and the outputs of a stage run."""
+        entry = self.entry(name, key)
+        # Written aside first, so an interrupted run never leaves a partial entry
+        partial = entry + ".partial"
+        if os.path.exists(partial):
+            shutil.rmtree(partial)
+        os.makedirs(partial)
+        for i, output in enumerate(outputs):
+            if os.path.exists(output):
+                _copy(output, os.path.join(partial, "files", str(i)))
+        with open(os.path.join(partial, "value.pkl"), "wb") as file:
+            pickle.dump(value, file)
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
+        os.replace(partial, entry)
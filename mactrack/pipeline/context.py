@@ -0,0 +1,50 @@
+import os
+
+BACKENDS = ("files", "memory")
+
+
+class RunContext:
+    """Where the stages of a run write their files.
+
+    A context is a plain picklable object, so it can be handed to worker
+    processes, and two runs with different output roots never write to the
+    same paths.
+
+    Args:
+        output_root (str, optional): Folder of the outputs. Defaults to
+            'output' in the current working directory.
+        scratch_dir (str, optional): Folder of the temporary files. Defaults
+            to 'scratch' in ``output_root``.
+        backend (str): "files" for the stages to also write their
+            intermediate images (list_comp, list_sep, list_def,
+            list_track), or "memory" to keep them in memory only.
+    """
+
+    def __init__(self, output_root=None, scratch_dir=None, backend="files"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown I/O backend: {backend}")
+        if output_root is None:
+            output_root = os.path.join(os.getcwd(), "output")
+        self.output_root = os.path.abspath(output_root)
+        if scratch_dir is None:
+            scratch_dir = os.path.join(self.output_root, "scratch")
+        self.scratch_dir = os.path.abspath(scratch_dir)
+        self.backend = backend
+
+    @property
+    def export(self):
+        """Whether the intermediate images are written."""
+        return self.backend == "files"
+
+    def path(self, *parts):
+        """Path inside the output root."""
+        return os.path.join(self.output_root, *parts)
+
+    def scratch(self, *parts):
+        """Path inside the scratch folder."""
+        return os.path.join(self.scratch_dir, *parts)
+
+
+def run_context(context=None):
+    """The given context, or the default one rooted at './output'."""
+    return context if context is not None else RunContext()
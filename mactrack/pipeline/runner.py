@@ -0,0 +1,322 @@
+import os
+import sys
+import copy
+import glob
+import functools
+import shutil
+import cv2
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from pipeline.cache import StageCache, stage_key
+from pipeline.context import run_context
+from video.source import FrameSource, find_video
+from video.inputconfig import inputconfig
+from video.result import result
+from locate.locate import locate
+from locate.list_sep import segmentation
+from locate.defuse import defuse, invdefuse
+from track.track import track
+from track.filtre import supprimer_petit
+from analyse.features import extract_features
+from analyse.intensity import intensitymed
+from analyse.distance import distance
+from analyse.size import size
+from analyse.perimeter import perimeter
+from analyse.recap import aggregate
+
+
+class Stage:
+    """A step of a :class:`Pipeline`.
+
+    Args:
+        name (str): Name of the stage, also the key of its value in the results.
+        func (callable): Called as ``func(results, **params)``, where
+            ``results`` holds the values of the previous stages.
+        params (dict, optional): Parameters of the stage, part of its key.
+        inputs (list): Input files, hashed by content for its key.
+        outputs (list): Files and folders it writes, cached with its value.
+        after (list): Names of the stages it depends on.
+    """
+
+    def __init__(self, name, func, params=None, inputs=(), outputs=(), after=()):
+        self.name = name
+        self.func = func
+        self.params = params or {}
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.after = list(after)
+
+
+class Pipeline:
+    """Ordered stages whose results are cached by content.
+
+    The key of a stage is a hash of its parameters, of the content of its
+    input files and of the keys of the stages it depends on. A stage whose
+    key is already in the cache is not run again: its value is read back and
+    its outputs are restored. Changing a parameter thus only reruns its stage
+    and the stages after it.
+
+    Args:
+        cache_dir (str): Folder of the cache.
+    """
+
+    def __init__(self, cache_dir="output/.cache"):
+        self.cache = StageCache(cache_dir)
+        self.stages = []
+
+    def add(self, name, func, params=None, inputs=(), outputs=(), after=()):
+        self.stages.append(Stage(name, func, params, inputs, outputs, after))
+        return self
+
+    def keys(self):
+        """Key of every stage, in order."""
+        keys = {}
+        for stage in self.stages:
+            keys[stage.name] = stage_key(
+                stage.name,
+                stage.params,
+                stage.inputs,
+                [keys[name] for name in stage.after],
+                self.cache.file_hash,
+            )
+        return keys
+
+    def run(self, force=()):
+        """Run the stages, reading the unchanged ones from the cache.
+
+        Args:
+            force (list): Names of stages to run even if they are cached.
+
+        Returns:
+            dict: Value of every stage, by name.
+        """
+        keys = self.keys()
+        results = {}
+        for stage in self.stages:
+            key = keys[stage.name]
+            if stage.name not in force and (stage.name, key) in self.cache:
+                print(f"{stage.name} : résultat en cache ({key[:12]})")
+                results[stage.name] = self.cache.load(stage.name, key, stage.outputs)
+            else:
+                print(f"{stage.name} : calcul ({key[:12]})")
+                results[stage.name] = stage.func(results, **stage.params)
+                self.cache.store(
+                    stage.name, key, results[stage.name], stage.outputs
+                )
+        return results
+
+
+def _inputconfig(results, input_folder, decode, context):
+    # Only the backgrounds and the number of frames are needed, the frames
+    # are streamed again by the next stages
+    return inputconfig(
+        input_folder,
+        write_frames=False,
+        source=FrameSource(input_folder, **decode),
+        background_dir=context.path("background"),
+        keep_frames=False,
+    )
+
+
+def _locate(
+    results, input_folder, min_shape_size, decode, context, chunk_size, workers
+):
+    image_storage = segmentation(context.path("list_sep"))
+    locate(
+        input_folder,
+        source=FrameSource(input_folder, **decode),
+        image_storage=image_storage,
+        export=False,
+        min_shape_size=min_shape_size,
+        chunk_size=chunk_size,
+        workers=workers,
+        context=context,
+    )
+    return image_storage
+
+
+def _defuse(results, split, context):
+    n = results["inputconfig"]
+    # The located objects are kept intact, as the value of 'locate'
+    image_storage = copy.deepcopy(results["locate"])
+    image_storage = defuse(n, image_storage, split)
+    return invdefuse(n, image_storage, split, context=context)
+
+
+def _track(results, threshold_iou, mode, context):
+    if os.path.exists(context.path("list_track")):
+        shutil.rmtree(context.path("list_track"))
+    return track(
+        results["inputconfig"],
+        threshold_iou,
+        results["defuse"],
+        mode=mode,
+        context=context,
+    )
+
+
+def _filter(results, p, context):
+    tracks = copy.deepcopy(results["track"])
+    supprimer_petit(p, tracks, context=context)
+    return tracks
+
+
+def _analyse(results, input_folder, decode, context):
+    n = results["inputconfig"]
+    background_path = context.path("background", "mediane.png")
+    background = cv2.imread(background_path)
+    if background is None:
+        raise FileNotFoundError(f"Could not read {background_path}")
+    features = extract_features(
+        n,
+        FrameSource(input_folder, **decode),
+        background,
+        tracks=results["filter"],
+        image_storage=results["defuse"],
+        context=context,
+    )
+    aggregate(
+        distance(n, features, context=context),
+        intensitymed(
+            n,
+            FrameSource(input_folder, **decode),
+            input_folder,
+            features,
+            context=context,
+            background_dir=context.path("background"),
+        ),
+        size(n, features, context=context),
+        perimeter(n, features, context=context),
+        context=context,
+    )
+    return features
+
+
+def _render(results, input_folder, decode, context):
+    result(
+        input_folder,
+        source=FrameSource(input_folder, **decode),
+        context=context,
+        tracks=results["filter"],
+        image_storage=results["defuse"],
+    )
+
+
+def mactrack_pipeline(
+    input_folder,
+    threshold_iou=0.5,
+    p=10,
+    min_shape_size=100,
+    mode="greedy",
+    split="lines",
+    cache_dir=None,
+    context=None,
+    decode=None,
+    chunk_size=16,
+    workers=1,
+):
+    """The mactrack stages, from the videos to the reports and the result videos.
+
+    inputconfig -> locate -> defuse -> track -> filter -> analyse, render. The
+    frames are streamed from the videos with :class:`FrameSource`. The
+    videos and the ``elite.json`` files of the models are hashed, so a new
+    video or model reruns everything, while changing ``threshold_iou`` only
+    reruns the tracking and what follows, and changing ``p`` only the
+    filtering and what follows.
+
+    Args:
+        input_folder (str): Path to the input folder, with the red video, the
+            green video in 'vert' and the 'models' folder.
+        threshold_iou (float): Minimal IoU to link two objects.
+        p (int): Tracks found in ``p`` frames or fewer are removed.
+        min_shape_size (int): Objects enclosing a smaller contour area are removed.
+        mode (str): Tracking mode, see :func:`track.track.track`.
+        split (str): Split mode of the merged objects, see :func:`locate.defuse.defuse`.
+        cache_dir (str, optional): Folder of the cache. Defaults to '.cache'
+            in the output root.
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+        decode (dict, optional): Options of the :class:`FrameSource` of every
+            stage, e.g. ``{"stride": 4, "scale": 0.25}`` for a quick look.
+        chunk_size (int, optional): Number of frames segmented at once by
+            ``locate``, see :func:`locate.locate.chunked_heatmaps`. With None,
+            the whole video is segmented at once, in memory.
+        workers (int): Number of worker processes of ``locate``.
+
+    Returns:
+        Pipeline: The pipeline, to be run with :meth:`Pipeline.run`.
+    """
+    context = run_context(context)
+    decode = decode or {}
+    videos = [
+        find_video(input_folder),
+        find_video(os.path.join(input_folder, "vert")),
+    ]
+    models = sorted(glob.glob(os.path.join(input_folder, "models", "*", "elite.json")))
+    # The input folder and the context are bound rather than hashed, the
+    # inputs are keyed by content. The inference settings do not change the
+    # objects found, so they are bound too
+    pipeline = Pipeline(cache_dir or context.path(".cache"))
+    pipeline.add(
+        "inputconfig",
+        functools.partial(_inputconfig, input_folder=input_folder, context=context),
+        {"decode": decode},
+        inputs=videos,
+        # The backgrounds are written in the output root, so that runs sharing
+        # the input folder do not overwrite each other's
+        outputs=[
+            context.path("background", "moyenne.png"),
+            context.path("background", "mediane.png"),
+        ],
+    )
+    pipeline.add(
+        "locate",
+        functools.partial(
+            _locate,
+            input_folder=input_folder,
+            context=context,
+            chunk_size=chunk_size,
+            workers=workers,
+        ),
+        {"min_shape_size": min_shape_size, "decode": decode},
+        inputs=videos + models,
+    )
+    pipeline.add(
+        "defuse",
+        functools.partial(_defuse, context=context),
+        {"split": split},
+        after=["locate", "inputconfig"],
+    )
+    pipeline.add(
+        "track",
+        functools.partial(_track, context=context),
+        {"threshold_iou": threshold_iou, "mode": mode},
+        outputs=[context.path("tracks.csv"), context.path("list_track")],
+        after=["defuse"],
+    )
+    pipeline.add(
+        "filter",
+        functools.partial(_filter, context=context),
+        {"p": p},
+        outputs=[context.path("tracks.csv"), context.path("list_track")],
+        after=["track"],
+    )
+    pipeline.add(
+        "analyse",
+        functools.partial(_analyse, input_folder=input_folder, context=context),
+        {"decode": decode},
+        inputs=videos,
+        outputs=[context.path("data"), context.path("plot")],
+        after=["filter", "defuse", "inputconfig"],
+    )
+    pipeline.add(
+        "render",
+        functools.partial(_render, input_folder=input_folder, context=context),
+        {"decode": decode},
+        inputs=videos,
+        outputs=[
+            context.path("result_video.mp4"),
+            context.path("result_video_v.mp4"),
+        ],
+        after=["filter", "defuse", "inputconfig"],
+    )
+    return pipeline
@@ -0,0 +1,105 @@
+import os
+import sys
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from track.matching import iou_matrix
+from track.table import TrackTable
+
+# Cost of the forbidden links, larger than any allowed link
+FORBIDDEN = 1e6
+
+
+def link_costs(store, frame, ends, threshold_iou, max_distance, gap_penalty):
+    """Cost of linking the objects of a frame to the last objects of the tracks.
+
+    The cost of a link is ``(1 - IoU) + distance / max_distance``, plus
+    ``gap_penalty`` for every frame skipped between the two objects. Links
+    between objects further than ``max_distance`` apart and overlapping with
+    an IoU of ``threshold_iou`` or less are forbidden.
+
+    Args:
+        store (ObjectStore): The segmented objects.
+        frame (int): Frame of the rows.
+        ends (list): (frame, object) of the last object of each track, for the columns.
+        threshold_iou (float): IoU above which a link is always allowed.
+        max_distance (float): Maximal centroid distance of a link, in pixels.
+        gap_penalty (float): Cost added for each skipped frame.
+
+    Returns:
+        tuple: (n, m) cost matrix and boolean matrix of the allowed links.
+    """
+    table = store.frame_table(frame)
+    end_frames = np.array([f for f, _ in ends], dtype=np.int64)
+    end_centroids = np.empty((len(ends), 2))
+    ious = np.zeros((len(table["ids"]), len(ends)))
+    for f in np.unique(end_frames):
+        columns = np.nonzero(end_frames == f)[0]
+        table_f = store.frame_table(int(f))
+        position = {obj: r for r, obj in enumerate(table_f["ids"].tolist())}
+        rows_f = [position[ends[c][1]] for c in columns]
+        end_centroids[columns] = table_f["centroids"][rows_f]
+        ious[:, columns] = iou_matrix(store, frame, int(f)).toarray()[:, rows_f]
+
+    distances = cdist(table["centroids"], end_centroids)
+    costs = (1 - ious) + distances / max_distance
+    costs += gap_penalty * (frame - end_frames - 1)[np.newaxis, :]
+    allowed = (distances <= max_distance) | (ious > threshold_iou)
+    costs[~allowed] = FORBIDDEN
+    return costs, allowed
+
+
+def assign_tracks(
+    n, image_storage, threshold_iou=0.5, max_distance=20.0, window=3, gap_penalty=0.5
+):
+    """Track the objects with a globally optimal assignment between frames.
+
+    At each frame, the objects are matched one to one with the tracks whose
+    last object is in one of the ``window`` previous frames, by solving the
+    assignment problem on :func:`link_costs` with
+    ``scipy.optimize.linear_sum_assignment``. A track can thus skip up to
+    ``window - 1`` frames where its object was missed (gap closing). The
+    objects left unmatched start new tracks.
+
+    Args:
+        n (int): Number of frames.
+        image_storage (ObjectStore): The segmented objects.
+        threshold_iou (float): IoU above which a link is always allowed.
+        max_distance (float): Maximal centroid distance of a link, in pixels.
+        window (int): Number of previous frames in which a track can end.
+        gap_penalty (float): Cost added for each skipped frame.
+
+    Returns:
+        TrackTable: The tracks. Each object belongs to one track at most.
+    """
+    table = TrackTable()
+    last = {}
+    for obj in image_storage.objects(0) or []:
+        last[table.new_track(0, obj)] = (0, obj)
+
+    for i in range(1, n):
+        print(f"heatmap_test_{i}")
+        ids = image_storage.frame_table(i)["ids"].tolist()
+        active = [t for t, (f, _) in last.items() if f >= i - window]
+        matched = set()
+        if ids and active:
+            costs, allowed = link_costs(
+                image_storage,
+                i,
+                [last[t] for t in active],
+                threshold_iou,
+                max_distance,
+                gap_penalty,
+            )
+            for r, c in zip(*linear_sum_assignment(costs)):
+                if allowed[r, c]:
+                    table.append(active[c], i, ids[r])
+                    last[active[c]] = (i, ids[r])
+                    matched.add(r)
+
+        for r, obj in enumerate(ids):
+            if r not in matched:
+                last[table.new_track(i, obj)] = (i, obj)
+    return table
@@ -1,9 +1,25 @@
 import os
+import sys
 import shutil
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from pipeline.context import run_context
 
-def supprimer_petit(p):
-    dossier_principal = "output/list_track"
+
+def supprimer_petit(p, table=None, context=None):
+    """Remove the tracks found in ``p`` frames or fewer.
+
+    Args:
+        p (int): Minimal number of frames, exclusive, of a kept track.
+        table (TrackTable, optional): Track table also filtered, and saved
+            again to 'tracks.csv'.
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+    """
+    context = run_context(context)
+    if table is not None:
+        table.remove_short(p)
+        table.save(context.path("tracks.csv"))
+    dossier_principal = context.path("list_track")
     for root, dirs, files in os.walk(dossier_principal):
         for dir in dirs:
             chemin_sous_dossier = os.path.join(root, dir)
@@ -0,0 +1,97 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+
+
+def candidate_pairs(bboxes_a, bboxes_b):
+    """Find the pairs of objects whose bounding boxes overlap.
+
+    The boxes of ``bboxes_b`` are sorted by their left edge once, so each box
+    of ``bboxes_a`` is only compared with the boxes starting before its right
+    edge (a sorted sweep along x), and then checked along y.
+
+    Args:
+        bboxes_a (numpy.ndarray): (n, 4) array of x, y, width, height.
+        bboxes_b (numpy.ndarray): (m, 4) array of x, y, width, height.
+
+    Returns:
+        tuple: Two arrays with the indices in ``bboxes_a`` and ``bboxes_b`` of
+        every overlapping pair.
+    """
+    bboxes_a = np.asarray(bboxes_a).reshape(-1, 4)
+    bboxes_b = np.asarray(bboxes_b).reshape(-1, 4)
+    order = np.argsort(bboxes_b[:, 0], kind="stable")
+    left_b = bboxes_b[order, 0]
+    right_b = left_b + bboxes_b[order, 2]
+    top_b = bboxes_b[order, 1]
+    bottom_b = top_b + bboxes_b[order, 3]
+
+    rows, cols = [], []
+    for i, (x, y, w, h) in enumerate(bboxes_a):
+        # Boxes of b starting left of the right edge of a
+        end = np.searchsorted(left_b, x + w, side="left")
+        overlap = (right_b[:end] > x) & (top_b[:end] < y + h) & (bottom_b[:end] > y)
+        hits = np.nonzero(overlap)[0]
+        rows.extend([i] * len(hits))
+        cols.extend(order[hits])
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+
+
+def crop_iou(bbox_a, mask_a, bbox_b, mask_b):
+    """IoU of two cropped masks, computed on the overlap of their bounding boxes only.
+
+    Args:
+        bbox_a (tuple): x, y, width, height of ``mask_a`` in the frame.
+        mask_a (numpy.ndarray): Boolean mask cropped to ``bbox_a``.
+        bbox_b (tuple): x, y, width, height of ``mask_b`` in the frame.
+        mask_b (numpy.ndarray): Boolean mask cropped to ``bbox_b``.
+
+    Returns:
+        float: Intersection over union of the two masks.
+    """
+    xa, ya, wa, ha = bbox_a
+    xb, yb, wb, hb = bbox_b
+    x0, y0 = max(xa, xb), max(ya, yb)
+    x1, y1 = min(xa + wa, xb + wb), min(ya + ha, yb + hb)
+    intersection = 0
+    if x0 < x1 and y0 < y1:
+        intersection = np.logical_and(
+            mask_a[y0 - ya : y1 - ya, x0 - xa : x1 - xa],
+            mask_b[y0 - yb : y1 - yb, x0 - xb : x1 - xb],
+        ).sum()
+    union = mask_a.sum() + mask_b.sum() - intersection
+    return intersection / union if union != 0 else 0
+
+
+def iou_matrix(store, frame_a, frame_b):
+    """Sparse IoU matrix between the objects of two frames of an :class:`ObjectStore`.
+
+    Candidate pairs are pruned with :func:`candidate_pairs`, and the IoU is
+    then computed on the bounding box crops of the remaining pairs only.
+
+    Args:
+        store (ObjectStore): The segmented objects.
+        frame_a (int): Frame of the rows.
+        frame_b (int): Frame of the columns.
+
+    Returns:
+        scipy.sparse.csr_matrix: IoU of every overlapping pair. Rows and
+        columns follow ``store.frame_table(frame)["ids"]``.
+    """
+    table_a = store.frame_table(frame_a)
+    table_b = store.frame_table(frame_b)
+    rows, cols = candidate_pairs(table_a["bboxes"], table_b["bboxes"])
+
+    values = []
+    masks_a, masks_b = {}, {}
+    for i, j in zip(rows, cols):
+        if i not in masks_a:
+            masks_a[i] = store.mask(frame_a, table_a["ids"][i])
+        if j not in masks_b:
+            masks_b[j] = store.mask(frame_b, table_b["ids"][j])
+        values.append(
+            crop_iou(table_a["bboxes"][i], masks_a[i], table_b["bboxes"][j], masks_b[j])
+        )
+    values = np.array(values, dtype=np.float64)
+    keep = values > 0
+    shape = (len(table_a["ids"]), len(table_b["ids"]))
+    return coo_matrix((values[keep], (rows[keep], cols[keep])), shape=shape).tocsr()
@@ -0,0 +1,91 @@
+import os
+import csv
+import cv2
+
+
+class TrackTable:
+    """In-memory membership of the tracked objects.
+
+    Attributes:
+        tracks (dict): Track id -> list of (frame, object) in frame order.
+        index (dict): (frame, object) -> id of the first track it was added to.
+    """
+
+    def __init__(self):
+        self.tracks = {}
+        self.index = {}
+        self._last_id = 0
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __iter__(self):
+        return iter(sorted(self.tracks))
+
+    def new_track(self, frame, obj):
+        """Start a new track with an object and return its id (1, 2, ...)."""
+        self._last_id += 1
+        track_id = self._last_id
+        self.tracks[track_id] = []
+        self.append(track_id, frame, obj)
+        return track_id
+
+    def append(self, track_id, frame, obj):
+        """Add an object to a track. An object can belong to several tracks."""
+        members = self.tracks[track_id]
+        if not members or members[-1] != (frame, obj):
+            members.append((frame, obj))
+        self.index.setdefault((frame, obj), track_id)
+
+    def track_of(self, frame, obj):
+        """Id of the first track containing the object, or None."""
+        return self.index.get((frame, obj))
+
+    def remove_short(self, p):
+        """Remove the tracks with ``p`` objects or fewer, as ``supprimer_petit``."""
+        for track_id in [t for t, members in self.tracks.items() if len(members) <= p]:
+            del self.tracks[track_id]
+        self.index = {}
+        for track_id in sorted(self.tracks):
+            for member in self.tracks[track_id]:
+                self.index.setdefault(member, track_id)
+
+    def save(self, path):
+        """Write the table as a ``track,frame,object`` CSV file."""
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["track", "frame", "object"])
+            for track_id in self:
+                for frame, obj in self.tracks[track_id]:
+                    writer.writerow([track_id, frame, obj])
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by :meth:`save`."""
+        table = cls()
+        with open(path, newline="") as file:
+            for row in csv.DictReader(file):
+                track_id = int(row["track"])
+                table.tracks.setdefault(track_id, [])
+                table._last_id = max(table._last_id, track_id)
+                table.append(track_id, int(row["frame"]), int(row["object"]))
+        return table
+
+    def export_folders(self, image_storage, root_folder="output/list_track"):
+        """Materialize the tracks as ``macrophage_<id>/<frame>_<object>.png`` folders.
+
+        Args:
+            image_storage (ObjectStore): Objects of the tracks.
+            root_folder (str): Folder in which the track folders are created.
+        """
+        for track_id in self:
+            output_folder = os.path.join(root_folder, f"macrophage_{track_id}")
+            os.makedirs(output_folder, exist_ok=True)
+            for frame, obj in self.tracks[track_id]:
+                cv2.imwrite(
+                    os.path.join(output_folder, f"{frame}_{obj}.png"),
+                    image_storage.dense(frame, obj),
+                )
@@ -1,8 +1,13 @@
 import os
-import shutil
-import cv2
+import sys
 import numpy as np
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from track.matching import iou_matrix
+from track.table import TrackTable
+from track.assign import assign_tracks
+from pipeline.context import run_context
+
 
 def calculate_iou(image1, image2):
     intersection = np.logical_and(image1, image2).sum()
@@ -20,56 +25,76 @@ def find_containing_folder(image_path, root_folder):
     return None
 
 
-def track(n, threshold_iou, image_storage):
-    c = 1
+def track(
+    n,
+    threshold_iou,
+    image_storage,
+    export=None,
+    mode="greedy",
+    max_distance=20.0,
+    window=3,
+    context=None,
+):
+    """Link the objects of consecutive frames into tracks.
 
-    for j, filename in enumerate(os.listdir("output/list_def/heatmap_test_0")):
-        image_number = filename.split("_")[1].split(".")[0]
-        image_path = os.path.join("output/list_def/heatmap_test_0", filename)
-        output_folder = os.path.join("output/list_track", f"macrophage_{c}")
-        os.makedirs(output_folder, exist_ok=True)
-        new_filename = f"0_{image_number}.png"
-        output_path = os.path.join(output_folder, new_filename)
-        shutil.copy(image_path, output_path)
-        c = c + 1
+    With ``mode="greedy"``, an object of frame i joins the track of every
+    object of frame i - 1 it overlaps with an IoU above ``threshold_iou``, and
+    starts a new track otherwise. With ``mode="hungarian"``, the objects are
+    matched one to one by :func:`track.assign.assign_tracks`, from their IoU
+    and centroid distance, with gap closing over ``window`` frames. Tracks are
+    built in memory and saved to 'tracks.csv' in the output root.
 
-    for i in range(1, n):
-        print(f"heatmap_test_{i}")
-        current = len(image_storage.get_list(f"heatmap_test_{i}"))
-        for j in range(0, current):
-            image = image_storage.get_image(f"heatmap_test_{i}", f"object_{j}.png")
-            image = image.toarray()
-            _, image1 = cv2.threshold(image, 127, 255, cv2.THRESH_BINARY)
-            previous = len(image_storage.get_list(f"heatmap_test_{i-1}"))
+    Args:
+        n (int): Number of frames.
+        threshold_iou (float): Minimal IoU to link two objects.
+        image_storage (ObjectStore): The segmented objects.
+        export (bool, optional): Whether to also write the 'list_track'
+            folders. Defaults to the backend of the context.
+        mode (str): "greedy" or "hungarian".
+        max_distance (float): Maximal centroid distance of a link, in pixels
+            (hungarian mode only).
+        window (int): Number of previous frames in which a track can be
+            continued (hungarian mode only).
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+
+    Returns:
+        TrackTable: The tracks.
+    """
+    if mode == "hungarian":
+        table = assign_tracks(
+            n, image_storage, threshold_iou, max_distance=max_distance, window=window
+        )
+    elif mode == "greedy":
+        table = _greedy_tracks(n, threshold_iou, image_storage)
+    else:
+        raise ValueError(f"Unknown tracking mode: {mode}")
 
-            for k in range(0, previous):
-                imagecomp = image_storage.get_image(
-                    f"heatmap_test_{i-1}", f"object_{k}.png"
-                )
-                imagecomp = imagecomp.toarray()
-                _, image2 = cv2.threshold(imagecomp, 127, 255, cv2.THRESH_BINARY)
+    context = run_context(context)
+    if export is None:
+        export = context.export
+    table.save(context.path("tracks.csv"))
+    if export:
+        table.export_folders(image_storage, context.path("list_track"))
+    return table
 
-                iou = calculate_iou(image1, image2)
-                containing_folder = find_containing_folder(
-                    f"output/list_track/{i-1}_{k}.png", "output/list_track"
-                )
 
+def _greedy_tracks(n, threshold_iou, image_storage):
+    table = TrackTable()
+    for obj in image_storage.objects(0):
+        table.new_track(0, obj)
+
+    for i in range(1, n):
+        print(f"heatmap_test_{i}")
+        # Sparse IoU between the objects of frame i and frame i - 1
+        ious = iou_matrix(image_storage, i, i - 1)
+        ids = image_storage.frame_table(i)["ids"].tolist()
+        ids_previous = image_storage.frame_table(i - 1)["ids"].tolist()
+        for r, j in enumerate(ids):
+            row = ious.getrow(r)
+            for col, iou in sorted(zip(row.indices, row.data)):
                 if iou > threshold_iou:
-                    new_filename = f"{i}_{j}.png"
-                    output_path = os.path.join(containing_folder, new_filename)
-                    shutil.copy(
-                        f"output/list_def/heatmap_test_{i}/object_{j}.png", output_path
-                    )
+                    table.append(table.track_of(i - 1, ids_previous[col]), i, j)
 
-            folder = find_containing_folder(
-                f"output/list_track/{i}_{j}.png", "output/list_track"
-            )
-            if folder == None:
-                output_folder = os.path.join("output/list_track", f"macrophage_{c}")
-                os.makedirs(output_folder, exist_ok=True)
-                new_filename = f"{i}_{j}.png"
-                output_path = os.path.join(output_folder, new_filename)
-                shutil.copy(
-                    f"output/list_def/heatmap_test_{i}/object_{j}.png", output_path
-                )
-                c = c + 1
+            if table.track_of(i, j) is None:
+                table.new_track(i, j)
+    return table
@@ -0,0 +1,109 @@
+import os
+import cv2
+import numpy as np
+
+
+def write_green_image(green, output_file):
+    """Write a single-channel image as the green channel of a BGR image."""
+    image = np.zeros((green.shape[0], green.shape[1], 3), dtype=np.uint8)
+    image[:, :, 1] = green
+    cv2.imwrite(output_file, image)
+
+
+class GreenBackground:
+    """Single-pass estimation of the green channel background (F0).
+
+    Frames are fed one at a time with :meth:`update`. The running sum gives
+    the mean image, and a per-pixel histogram of the 256 green levels gives
+    the median and any percentile, so the memory used does not depend on the
+    number of frames. The histogram is stored level by level, one contiguous
+    row of pixel counts per level, as uint16 counts until a pixel could
+    reach 65536 frames.
+
+    Args:
+        percentile (float, optional): Percentile (0-100) also saved by :meth:`save`
+            as an alternative F0.
+    """
+
+    def __init__(self, percentile=None):
+        self.percentile = percentile
+        self.count = 0
+        self.shape = None
+        self._sum = None
+        self._hist = None
+        self._pixels = None
+
+    def update(self, frame_v):
+        """Add a BGR green channel frame to the estimation."""
+        if self.shape is None:
+            self.shape = frame_v.shape[:2]
+            self._sum = np.zeros(self.shape, dtype=np.float64)
+            pixels = self.shape[0] * self.shape[1]
+            self._hist = np.zeros((256, pixels), dtype=np.uint16)
+            self._pixels = np.arange(pixels)
+        elif frame_v.shape[:2] != self.shape:
+            height, width = self.shape
+            frame_v = cv2.resize(frame_v, (width, height), interpolation=cv2.INTER_AREA)
+
+        if self.count == np.iinfo(self._hist.dtype).max:
+            self._hist = self._hist.astype(np.uint32)
+
+        green = frame_v[:, :, 1]
+        self._sum += green
+        # Each pixel appears once per frame, so fancy indexing is a valid increment
+        self._hist[green.ravel(), self._pixels] += 1
+        self.count += 1
+
+    def _check(self):
+        if self.count == 0:
+            raise ValueError("No frame was given to the background estimation.")
+
+    def _ranks(self, ranks):
+        """Green level of every pixel at the given (0-based) ranks of its sorted values."""
+        pixels = self._hist.shape[1]
+        cumulative = np.zeros(pixels, dtype=np.int64)
+        values = [np.zeros(pixels, dtype=np.uint16) for _ in ranks]
+        for level in range(256):
+            cumulative += self._hist[level]
+            # The value at a rank is the first level whose cumulative count exceeds it
+            for rank, value in zip(ranks, values):
+                value += cumulative <= rank
+            # Every pixel has passed every rank, the next levels add nothing
+            if cumulative.min() > max(ranks):
+                break
+        return [value.reshape(self.shape).astype(np.uint8) for value in values]
+
+    def mean(self):
+        """Mean green level of every pixel, as uint8."""
+        self._check()
+        return (self._sum / self.count).astype(np.uint8)
+
+    def median(self):
+        """Median green level of every pixel, as ``np.median`` cast to uint8."""
+        self._check()
+        low, high = self._ranks([(self.count - 1) // 2, self.count // 2])
+        return ((low.astype(np.float64) + high) / 2).astype(np.uint8)
+
+    def percentile_image(self, q):
+        """Green level percentile of every pixel, with linear interpolation."""
+        self._check()
+        rank = q / 100 * (self.count - 1)
+        low, high = self._ranks([int(np.floor(rank)), int(np.ceil(rank))])
+        fraction = rank - np.floor(rank)
+        return (low + (high.astype(np.float64) - low) * fraction).astype(np.uint8)
+
+    def save(self, output_path):
+        """Write ``moyenne.png``, ``mediane.png`` and the optional percentile image.
+
+        Args:
+            output_path (str): Folder where the images are written, usually 'vert'.
+        """
+        write_green_image(self.mean(), os.path.join(output_path, "moyenne.png"))
+        print(f"Average green intensity image saved to {output_path}")
+        output_file = os.path.join(output_path, "mediane.png")
+        write_green_image(self.median(), output_file)
+        print(f"Median green image saved to {output_file}")
+        if self.percentile is not None:
+            output_file = os.path.join(output_path, f"percentile_{self.percentile}.png")
+            write_green_image(self.percentile_image(self.percentile), output_file)
+            print(f"Percentile green image saved to {output_file}")
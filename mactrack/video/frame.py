@@ -1,10 +1,119 @@
+import os
+import tempfile
+import numpy as np
+
+
+class _FrameArray:
+    """Growable stack of same-sized uint8 frames stored in one contiguous array.
+
+    When ``scratch_dir`` is given, the array is a ``np.memmap`` backed by a
+    file of that folder, so the frames live in the page cache rather than in
+    the process memory, and other processes can map the same file.
+    """
+
+    def __init__(self, capacity=64, scratch_dir=None):
+        self.capacity = max(1, capacity)
+        self.scratch_dir = scratch_dir
+        self.path = None
+        self.count = 0
+        self._data = None
+
+    def _allocate(self, shape):
+        if self.scratch_dir is None:
+            return np.empty(shape, dtype=np.uint8), None
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".frames", dir=self.scratch_dir)
+        os.close(fd)
+        return np.memmap(path, dtype=np.uint8, mode="w+", shape=shape), path
+
+    def _release(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+    def append(self, frame):
+        if self._data is None:
+            self._data, self.path = self._allocate((self.capacity,) + frame.shape)
+        elif frame.shape != self._data.shape[1:]:
+            raise ValueError(
+                f"Frame shape {frame.shape} does not match {self._data.shape[1:]}."
+            )
+        if self.count == self._data.shape[0]:
+            # Double the capacity, copying the frames already stored
+            data, path = self._allocate((2 * self.count,) + frame.shape)
+            data[: self.count] = self._data
+            self._data = None
+            self._release()
+            self._data, self.path = data, path
+        self._data[self.count] = frame
+        self.count += 1
+
+    @property
+    def view(self):
+        if self._data is None:
+            return np.empty((0,), dtype=np.uint8)
+        return self._data[: self.count]
+
+    def close(self):
+        self._data = None
+        self._release()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path is not None:
+            # Only the location of the memory-mapped file is sent to other processes
+            self._data.flush()
+            state["_data"] = self._data.shape
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.path is not None:
+            self._data = np.memmap(
+                self.path, dtype=np.uint8, mode="r+", shape=state["_data"]
+            )
+            # The file belongs to the process that created it
+            self.scratch_dir = None
+            self.path = None
+
+
 class VideoFrames:
-    def __init__(self):
-        self.frames = []
-        self.frames_v = []
+    """Red (``frames``) and green (``frames_v``) frames of a video.
+
+    Each channel is stored in a single preallocated uint8 array of shape
+    ``(n_frames, height, width, 3)``, so ``frames[a]`` and ``frames_v[a:b]``
+    are O(1) views without any copy. The arrays grow automatically if more
+    than ``capacity`` frames are added.
+
+    Args:
+        capacity (int, optional): Expected number of frames. Defaults to 64.
+        scratch_dir (str, optional): Folder in which the arrays are memory-mapped.
+            If None, the frames are kept in memory.
+    """
+
+    def __init__(self, capacity=None, scratch_dir=None):
+        capacity = capacity or 64
+        self._frames = _FrameArray(capacity, scratch_dir)
+        self._frames_v = _FrameArray(capacity, scratch_dir)
+
+    @property
+    def frames(self):
+        return self._frames.view
+
+    @property
+    def frames_v(self):
+        return self._frames_v.view
 
     def add_frame(self, frame):
-        self.frames.append(frame)
+        self._frames.append(frame)
 
     def add_frame_v(self, frame):
-        self.frames_v.append(frame)
+        self._frames_v.append(frame)
+
+    def __len__(self):
+        return min(self._frames.count, self._frames_v.count)
+
+    def close(self):
+        """Release the frame arrays and delete their scratch files, if any."""
+        self._frames.close()
+        self._frames_v.close()
@@ -1,7 +1,11 @@
 import cv2
 import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 from video.frame import VideoFrames
-import numpy as np
+from video.source import FrameSource
+from video.background import GreenBackground, write_green_image
 
 # def median_green_intensity(input_folder, output_path):
 #    image_files = [f for f in os.listdir(input_folder) if f.endswith('.jpg') or f.endswith('.png')]
@@ -28,153 +32,150 @@ import numpy as np
 #    cv2.imwrite(output_file, median_green_image)
 
 
-def median_green_intensity(input_folder, output_path):
-    image_files = [
-        f for f in os.listdir(input_folder) if f.endswith(".jpg") or f.endswith(".png")
-    ]
+def _green_images(images, extensions=None):
+    """List the images of a folder, or of an in-memory sequence of frames.
 
-    if not image_files:
-        print("No image files found in the folder.")
-        return
+    Returns:
+        tuple: The image names and an iterator of ``(name, image)`` pairs.
+    """
+    if not isinstance(images, str):
+        names = [f"frame {idx}" for idx in range(len(images))]
+        return names, zip(names, images)
 
-    first_image_path = os.path.join(input_folder, image_files[0])
-    first_image = cv2.imread(first_image_path, cv2.IMREAD_COLOR)
+    names = [
+        f
+        for f in os.listdir(images)
+        if os.path.isfile(os.path.join(images, f))
+        and (extensions is None or f.endswith(extensions))
+    ]
+    return names, (
+        (f, cv2.imread(os.path.join(images, f), cv2.IMREAD_COLOR)) for f in names
+    )
 
-    if first_image is None:
-        print(f"Error: Could not read {first_image_path}")
-        return
 
-    height, width, _ = first_image.shape
-    green_channel_values = np.zeros((height, width, len(image_files)), dtype=np.uint8)
+def median_green_intensity(input_folder, output_path):
+    image_files, images = _green_images(input_folder, (".jpg", ".png"))
 
-    for idx, image_file in enumerate(image_files):
-        image_path = os.path.join(input_folder, image_file)
-        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if not image_files:
+        print("No image files found in the folder.")
+        return
 
+    background = GreenBackground()
+    for image_file, image in images:
         if image is None:
             print(f"Warning: Could not read {image_file}, skipping.")
             continue
+        background.update(image)
 
-        # Vérifie la taille et redimensionne si nécessaire
-        if image.shape[:2] != (height, width):
-            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
-
-        green_channel_values[:, :, idx] = image[:, :, 1]  # Stocke le canal vert
-
-    median_green = np.median(green_channel_values, axis=2).astype(np.uint8)
-    median_green_image = np.zeros((height, width, 3), dtype=np.uint8)
-    median_green_image[:, :, 1] = median_green  # Assigner la médiane au canal vert
+    if background.count == 0:
+        print("Error: Could not read any image of the folder.")
+        return
 
     output_file = os.path.join(output_path, "mediane.png")
-    cv2.imwrite(output_file, median_green_image)
+    write_green_image(background.median(), output_file)
     print(f"Median green image saved to {output_file}")
 
 
 def create_average_green_image(folder_path, output_path):
-    image_files = [
-        f
-        for f in os.listdir(folder_path)
-        if os.path.isfile(os.path.join(folder_path, f))
-    ]
+    image_files, images = _green_images(folder_path)
     if not image_files:
         raise ValueError("No images found in the folder.")
 
-    green_sum = None
-    image_count = 0
-    target_size = None
-
-    for image_file in image_files:
-        image_path = os.path.join(folder_path, image_file)
-        image = cv2.imread(image_path)
-
+    background = GreenBackground()
+    for image_file, image in images:
         if image is None:
             print(f"Warning: Could not load image {image_file}, skipping.")
             continue
+        background.update(image)
 
-        if green_sum is None:
-            target_size = (image.shape[1], image.shape[0])  # (width, height)
-            green_sum = np.zeros((target_size[1], target_size[0]), dtype=np.float64)
-
-        if (image.shape[1], image.shape[0]) != target_size:
-            image = cv2.resize(image, target_size)
-
-        green_sum += image[:, :, 1]
-        image_count += 1
-
-    if image_count == 0:
+    if background.count == 0:
         raise ValueError("No valid images found in the folder.")
 
-    green_mean = (green_sum / image_count).astype(np.uint8)
-    average_green_image = np.zeros(
-        (green_mean.shape[0], green_mean.shape[1], 3), dtype=np.uint8
-    )
-    average_green_image[:, :, 1] = green_mean
-    cv2.imwrite(os.path.join(output_path, "moyenne.png"), average_green_image)
+    write_green_image(background.mean(), os.path.join(output_path, "moyenne.png"))
     print(f"Average green intensity image saved to {output_path}")
 
 
-def inputconfig(input_folder):
+def inputconfig(
+    input_folder,
+    write_frames=True,
+    scratch_dir=None,
+    percentile=None,
+    source=None,
+    background_dir=None,
+    keep_frames=True,
+):
+    """Decode the red and green videos of an input folder.
+
+    Frames are resized to half their size and kept in memory. By default they
+    are also written to ``dataset/test/test_x`` and ``vert/frames`` so that
+    ``locate`` can read them through kartezio. The mean and median green
+    backgrounds ('vert/moyenne.png' and 'vert/mediane.png') are estimated
+    in the same pass. When streaming the frames with a :class:`FrameSource`
+    instead, pass ``write_frames=False`` to skip the PNG dumps. For long
+    videos, ``scratch_dir`` memory-maps the frames to a scratch file instead
+    of keeping them in the process memory, and ``keep_frames=False`` does not
+    keep them at all, when only the backgrounds and the number of frames are
+    needed. Runs sharing an input folder should each give their own
+    ``background_dir``, e.g. in their output root.
+
+    Args:
+        input_folder (str): Path to the input folder.
+        write_frames (bool): Whether to write every frame to disk as PNG.
+        scratch_dir (str, optional): Folder where the frames are memory-mapped.
+        percentile (float, optional): Also save this percentile of the green
+            frames in 'vert' as an alternative F0.
+        source (FrameSource, optional): Source of the frames, to decode them
+            with a stride, a ROI or another scale. Defaults to
+            ``FrameSource(input_folder)``.
+        background_dir (str, optional): Folder where the backgrounds are
+            written. Defaults to 'vert'.
+        keep_frames (bool): Whether to keep the decoded frames.
+
+    Returns:
+        VideoFrames: The decoded red and green frames, or their number if
+        ``keep_frames`` is False.
+    """
     input_folder_v = os.path.join(input_folder, "vert")
     output_folder = os.path.join(input_folder, "dataset/test/test_x")
     output_folder_v = os.path.join(input_folder_v, "frames")
-    os.makedirs(output_folder_v, exist_ok=True)
-
-    # if the output folders are not empty, delete the content
-    for f in os.listdir(output_folder_v):
-        os.remove(os.path.join(output_folder_v, f))
-    for f in os.listdir(output_folder):
-        os.remove(os.path.join(output_folder, f))
-    video_files = [f for f in os.listdir(input_folder) if f.endswith(".mp4")]
-
-    if len(video_files) != 1:
-        print(
-            "Erreur: Aucun fichier vidéo ou plusieurs fichiers vidéo trouvés dans le dossier."
-        )
-        return
-
-    video_files_v = [f for f in os.listdir(input_folder_v) if f.endswith(".mp4")]
-
-    if len(video_files_v) != 1:
-        print(
-            "Erreur: Aucun fichier vidéo ou plusieurs fichiers vidéo trouvés dans le dossier."
-        )
-        return
-
-    video_filename = video_files[0]
-    video_path = os.path.join(input_folder, video_filename)
-    video_filename_v = video_files_v[0]
-    video_path_v = os.path.join(input_folder_v, video_filename_v)
-
-    video_capture = cv2.VideoCapture(video_path)
-    video_capture_v = cv2.VideoCapture(video_path_v)
-    count = 0
-    video_frames = VideoFrames()
-
-    while True:
-        success, frame = video_capture.read()
-        if not success:
-            break
-        success_v, frame_v = video_capture_v.read()
-        if not success_v:
-            break
-
-        frame_resized = cv2.resize(frame, (frame.shape[1] // 2, frame.shape[0] // 2))
-        frame_v_resized = cv2.resize(
-            frame_v, (frame_v.shape[1] // 2, frame_v.shape[0] // 2)
-        )
-
-        video_frames.add_frame(frame_resized)
-        video_frames.add_frame_v(frame_v_resized)
-
-        filename = os.path.join(output_folder, f"{count:03d}_image.png")
-        cv2.imwrite(filename, frame_resized)
-        filename_v = os.path.join(output_folder_v, f"{count:03d}_image.png")
-        cv2.imwrite(filename_v, frame_v_resized)
-        count += 1
-
-    video_capture.release()
-    video_capture_v.release()
-    create_average_green_image(output_folder_v, input_folder_v)
-    median_green_intensity(output_folder_v, input_folder_v)
 
+    if write_frames:
+        os.makedirs(output_folder_v, exist_ok=True)
+        # if the output folders are not empty, delete the content
+        for f in os.listdir(output_folder_v):
+            os.remove(os.path.join(output_folder_v, f))
+        for f in os.listdir(output_folder):
+            os.remove(os.path.join(output_folder, f))
+
+    if source is None:
+        try:
+            source = FrameSource(input_folder)
+        except FileNotFoundError as error:
+            print(error)
+            return
+
+    video_frames = None
+    if keep_frames:
+        video_frames = VideoFrames(capacity=len(source), scratch_dir=scratch_dir)
+    background = GreenBackground(percentile)
+
+    for count, frame_resized, frame_v_resized in source:
+        if keep_frames:
+            video_frames.add_frame(frame_resized)
+            video_frames.add_frame_v(frame_v_resized)
+        background.update(frame_v_resized)
+
+        if write_frames:
+            filename = os.path.join(output_folder, f"{count:03d}_image.png")
+            cv2.imwrite(filename, frame_resized)
+            filename_v = os.path.join(output_folder_v, f"{count:03d}_image.png")
+            cv2.imwrite(filename_v, frame_v_resized)
+
+    if background_dir is None:
+        background_dir = input_folder_v
+    os.makedirs(background_dir, exist_ok=True)
+    background.save(background_dir)
+
+    if not keep_frames:
+        return background.count
     return video_frames
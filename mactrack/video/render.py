@@ -0,0 +1,135 @@
+import os
+import sys
+import glob
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from locate.objects import (
+    folder_objects,
+    object_contours,
+    stored_contours,
+    table_objects,
+)
+
+
+def _anchor(centroid):
+    return (int(centroid[0]), int(centroid[1]))
+
+
+def track_index(list_track_folder=None, tracks=None, image_storage=None):
+    """Contours and label anchors of the tracked objects, indexed by frame.
+
+    The objects are read either once from the track folders, or from a
+    :class:`TrackTable` and the :class:`ObjectStore` holding its objects,
+    without touching the disk. The label of an object is anchored at its
+    centroid, taken from the store or computed once from its mask.
+
+    Args:
+        list_track_folder (str, optional): Folder of the ``macrophage_<id>`` folders.
+        tracks (TrackTable, optional): Tracks of the objects.
+        image_storage (ObjectStore, optional): Objects of ``tracks``.
+
+    Returns:
+        dict: Frame -> list of (track id, contours, anchor), sorted by track id.
+    """
+    if tracks is not None:
+        objects = table_objects(tracks)
+    else:
+        objects = folder_objects(list_track_folder)
+
+    index = {}
+    for a, items in objects.items():
+        index[a] = []
+        if tracks is not None:
+            table = image_storage.frame_table(a)
+            centroids = dict(zip(table["ids"].tolist(), table["centroids"]))
+        for track_id, obj, path in sorted(items):
+            if path is None:
+                contours = stored_contours(image_storage, a, obj)
+                anchor = _anchor(centroids[obj])
+            else:
+                image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                contours = object_contours(image)
+                M = cv2.moments(image, binaryImage=True)
+                if M["m00"] != 0:
+                    anchor = _anchor((M["m10"] / M["m00"], M["m01"] / M["m00"]))
+                else:
+                    anchor = (0, 0)
+            index[a].append((track_id, contours, anchor))
+    return index
+
+
+def draw_tracks(image, entries, style):
+    """Draw the contours and the ids of the tracked objects of a frame on a copy of ``image``.
+
+    Args:
+        image (numpy.ndarray): BGR frame.
+        entries (list): (track id, contours, anchor) of the objects of the frame.
+        style (TrackStyle): Colours and labels of the tracks.
+    """
+    image_copy = image.copy()
+    for track_id, contours, anchor in entries:
+        style.draw(image_copy, track_id, contours, anchor)
+    return image_copy
+
+
+def folder_frames(input_folder):
+    """Yield ``(index, frame, frame_v)`` from the frames written by ``inputconfig``."""
+    input_folder_v = os.path.join(input_folder, "vert/frames")
+    input_folder = os.path.join(input_folder, "dataset/test/test_x")
+    for image_path in sorted(glob.glob(os.path.join(input_folder, "*_image.png"))):
+        image_file = os.path.basename(image_path)
+        yield (
+            int(image_file.split("_")[0]),
+            cv2.imread(image_path),
+            cv2.imread(os.path.join(input_folder_v, image_file)),
+        )
+
+
+def _render_frame(a, frame, frame_v, entries, style, folders):
+    overlays = [
+        draw_tracks(image, entries, style) if image is not None else None
+        for image in (frame, frame_v)
+    ]
+    if folders is not None:
+        for image, folder in zip(overlays, folders):
+            if image is not None:
+                cv2.imwrite(
+                    os.path.join(folder, f"{a:03d}_with_all_macrophages.png"), image
+                )
+    return (a, *overlays)
+
+
+def render_frames(frames, index, style, folders=None, workers=None):
+    """Draw the tracks on the red and green frames, several frames at a time.
+
+    Each frame pair is drawn in one task of a thread pool, OpenCV releasing
+    the GIL while it draws and encodes. At most ``2 * workers`` frames are in
+    flight, so the frames can be streamed from a :class:`FrameSource`.
+
+    Args:
+        frames (iterable): ``(index, frame, frame_v)`` tuples.
+        index (dict): Contours of the tracked objects, see :func:`track_index`.
+        style (TrackStyle): Colours and labels of the tracks.
+        folders (tuple, optional): Red and green output folders, where the
+            tasks also write the overlays as ``<index>_with_all_macrophages.png``.
+        workers (int, optional): Number of threads. Defaults to the number of CPUs.
+
+    Yields:
+        tuple: ``(index, overlay, overlay_v)`` in frame order.
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for a, frame, frame_v in frames:
+            pending.append(
+                executor.submit(
+                    _render_frame, a, frame, frame_v, index.get(a, []), style, folders
+                )
+            )
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
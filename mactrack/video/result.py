@@ -1,108 +1,78 @@
 import os
+import sys
 import cv2
-import numpy as np
-import random
-
-
-def draw_contours(image, contours, number, colors):
-    color = colors[number % len(colors)]
-    for contour in contours:
-        cv2.drawContours(image, [contour], -1, color, 2)
-        M = cv2.moments(contour)
-        if M["m00"] != 0:
-            cX = int(M["m10"] / M["m00"])
-            cY = int(M["m01"] / M["m00"])
-        else:
-            cX, cY = contour[0][0]
-        cv2.putText(image, str(number), (cX, cY), cv2.FONT_HERSHEY_SIMPLEX, 2, color, 2)
-
-
-def generate_random_rgb_color():
-    return (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-
-
-def result(input_folder):
-    input_folder_v = os.path.join(input_folder, "vert/frames")
-    output_folder_v = "output/resultv"
-    list_track_folder_v = "output/list_track"
-    os.makedirs(output_folder_v, exist_ok=True)
-    input_folder = os.path.join(input_folder, "dataset/test/test_x")
-    output_folder = "output/result"
-    list_track_folder = "output/list_track"
-    os.makedirs(output_folder, exist_ok=True)
-
-    colors = [generate_random_rgb_color() for _ in range(100)]
-
-    for image_file in os.listdir(input_folder):
-        if image_file.endswith("_image.png"):
-            a = image_file.split("_")[0].zfill(3)
-            a_number = int(a)
-            image_path = os.path.join(input_folder, image_file)
-            original_image = cv2.imread(image_path)
-            image_copy = original_image.copy()
-
-            for macrophage_dir in os.listdir(list_track_folder):
-                if macrophage_dir.startswith("macrophage_"):
-                    b_number = int(macrophage_dir.split("_")[1])
-                    macrophage_path = os.path.join(list_track_folder, macrophage_dir)
-
-                    for track_image_file in os.listdir(macrophage_path):
-                        c, d = track_image_file.split("_")[:2]
-                        c_number = int(c)
-
-                        if c_number == a_number:
-                            track_image_path = os.path.join(
-                                macrophage_path, track_image_file
-                            )
-                            track_image = cv2.imread(
-                                track_image_path, cv2.IMREAD_GRAYSCALE
-                            )
-                            contours, _ = cv2.findContours(
-                                track_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-                            )
-                            draw_contours(image_copy, contours, b_number, colors)
-            output_image_path = os.path.join(
-                output_folder, f"{a}_with_all_macrophages.png"
-            )
-            cv2.imwrite(output_image_path, image_copy)
-
-    for image_file in os.listdir(input_folder_v):
-        if image_file.endswith("_image.png"):
-            a = image_file.split("_")[0].zfill(3)
-            a_number = int(a)
-            image_path = os.path.join(input_folder_v, image_file)
-            original_image = cv2.imread(image_path)
-            image_copy = original_image.copy()
-
-            for macrophage_dir in os.listdir(list_track_folder_v):
-                if macrophage_dir.startswith("macrophage_"):
-                    b_number = int(macrophage_dir.split("_")[1])
-                    macrophage_path = os.path.join(list_track_folder_v, macrophage_dir)
-
-                    for track_image_file in os.listdir(macrophage_path):
-                        c, d = track_image_file.split("_")[:2]
-                        c_number = int(c)
-
-                        if c_number == a_number:
-                            track_image_path = os.path.join(
-                                macrophage_path, track_image_file
-                            )
-                            track_image = cv2.imread(
-                                track_image_path, cv2.IMREAD_GRAYSCALE
-                            )
-                            contours, _ = cv2.findContours(
-                                track_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-                            )
-                            draw_contours(image_copy, contours, b_number, colors)
-            output_image_path = os.path.join(
-                output_folder_v, f"{a}_with_all_macrophages.png"
-            )
-            cv2.imwrite(output_image_path, image_copy)
-
-
-def video():
-    result_folder = "output/result"
-    video_output = "output/result_video.mp4"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from pipeline.context import run_context
+from video.sink import VideoSink
+from video.render import track_index, folder_frames, render_frames
+from visualisation.style import TrackStyle
+
+
+def result(
+    input_folder,
+    source=None,
+    context=None,
+    tracks=None,
+    image_storage=None,
+    workers=None,
+    save_frames=False,
+    fps=10.0,
+    style=None,
+):
+    """Draw the tracked macrophages on every red and green frame.
+
+    The frames are read from ``dataset/test/test_x`` and ``vert/frames``, or
+    taken directly from ``source`` when a :class:`FrameSource` is given. The
+    contours of the tracked objects are indexed by frame once, from
+    ``list_track`` or from ``tracks`` and ``image_storage`` when they are
+    given, and both overlays of a frame are drawn in the same task, see
+    :func:`video.render.render_frames`. The overlays are encoded directly
+    into 'result_video.mp4' and 'result_video_v.mp4' by a :class:`VideoSink`.
+
+    Args:
+        input_folder (str): Path to the input folder.
+        source (FrameSource, optional): Stream of (index, red, green) frames.
+        context (RunContext, optional): Output root of the run. Defaults to './output'.
+        tracks (TrackTable, optional): Tracks to draw instead of the ``list_track`` folders.
+        image_storage (ObjectStore, optional): Objects of ``tracks``.
+        workers (int, optional): Number of drawing threads.
+        save_frames (bool): Whether to also write every overlay as PNG in
+            'result' and 'resultv', for :func:`video`.
+        fps (float): Frame rate of the videos.
+        style (TrackStyle, optional): Colours and labels of the tracks.
+    """
+    context = run_context(context)
+    folders = None
+    if save_frames:
+        folders = (context.path("result"), context.path("resultv"))
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+    os.makedirs(context.output_root, exist_ok=True)
+
+    style = style or TrackStyle()
+    index = track_index(context.path("list_track"), tracks, image_storage)
+    frames = folder_frames(input_folder) if source is None else source
+
+    video_outputs = [
+        context.path("result_video.mp4"),
+        context.path("result_video_v.mp4"),
+    ]
+    with VideoSink(video_outputs, fps) as sink:
+        for _, overlay, overlay_v in render_frames(
+            frames, index, style, folders, workers
+        ):
+            if overlay is not None and overlay_v is not None:
+                sink.write(overlay, overlay_v)
+    for video_output in video_outputs:
+        print(f"Vidéo créée avec succès : {video_output}")
+
+
+def video(context=None):
+    """Encode the overlays saved by ``result(..., save_frames=True)`` into the result videos."""
+    context = run_context(context)
+    result_folder = context.path("result")
+    video_output = context.path("result_video.mp4")
     images = [img for img in os.listdir(result_folder) if img.endswith(".png")]
     images.sort()
 
@@ -124,8 +94,8 @@ def video():
     cv2.destroyAllWindows()
     print(f"Vidéo créée avec succès : {video_output}")
 
-    result_folder = "output/resultv"
-    video_output = "output/result_video_v.mp4"
+    result_folder = context.path("resultv")
+    video_output = context.path("result_video_v.mp4")
     images = [img for img in os.listdir(result_folder) if img.endswith(".png")]
     images.sort()
 
@@ -148,9 +118,10 @@ def video():
     print(f"Vidéo créée avec succès : {video_output}")
 
 
-def videocomp():
-    image_folder = "output/list_comp"
-    video_name = "output/result_video_w.mp4"
+def videocomp(context=None):
+    context = run_context(context)
+    image_folder = context.path("list_comp")
+    video_name = context.path("result_video_w.mp4")
     images = [img for img in os.listdir(image_folder) if img.endswith(".png")]
     images.sort(key=lambda x: int(x.split("_")[-1].split(".")[0]))
     first_image_path = os.path.join(image_folder, images[0])
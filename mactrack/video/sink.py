@@ -0,0 +1,85 @@
+import queue
+import threading
+import cv2
+
+
+class VideoSink:
+    """Writes frames to one or more videos from a background thread.
+
+    Each call to :meth:`write` hands one frame per video to the writer
+    thread through a bounded queue, so the caller only waits when the
+    encoder falls ``queue_size`` frames behind. The videos are opened on the
+    first frame, with its size. Errors of the writer thread are raised by
+    the next :meth:`write` or by :meth:`close`.
+
+    Args:
+        paths (list): Path of each video.
+        fps (float): Frame rate of the videos.
+        fourcc (str): Codec of the videos.
+        queue_size (int): Maximal number of frames waiting to be encoded.
+    """
+
+    def __init__(self, paths, fps=10.0, fourcc="mp4v", queue_size=16):
+        self.paths = list(paths)
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.count = 0
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._error = None
+        self._thread = threading.Thread(target=self._write_all, daemon=True)
+        self._thread.start()
+
+    def _open(self, frames):
+        writers = []
+        for path, frame in zip(self.paths, frames):
+            height, width = frame.shape[:2]
+            writer = cv2.VideoWriter(path, self.fourcc, self.fps, (width, height))
+            if not writer.isOpened():
+                raise IOError(f"Impossible d'ouvrir la vidéo : {path}")
+            writers.append(writer)
+        return writers
+
+    def _write_all(self):
+        writers = None
+        try:
+            while True:
+                frames = self._queue.get()
+                if frames is None:
+                    break
+                if writers is None:
+                    writers = self._open(frames)
+                for writer, frame in zip(writers, frames):
+                    writer.write(frame)
+        except Exception as error:
+            self._error = error
+            # Drain the queue so that write() and close() do not block
+            while self._queue.get() is not None:
+                pass
+        finally:
+            for writer in writers or []:
+                writer.release()
+
+    def _raise(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, *frames):
+        """Queue one frame for each video, in the order of ``paths``."""
+        if len(frames) != len(self.paths):
+            raise ValueError(f"Expected {len(self.paths)} frames, got {len(frames)}.")
+        self._raise()
+        self._queue.put(frames)
+        self.count += 1
+
+    def close(self):
+        """Wait for the queued frames to be encoded and release the videos."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
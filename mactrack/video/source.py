@@ -0,0 +1,247 @@
+import os
+import queue
+import threading
+import subprocess
+import cv2
+import numpy as np
+
+DECODE_BACKENDS = ("opencv", "ffmpeg")
+
+
+# Containers read by OpenCV's FFmpeg backend, in order of preference when a
+# video is found in several of them (e.g. an AVI and its MP4 conversion)
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v", ".mpg", ".mpeg", ".wmv")
+
+
+def find_video(folder):
+    """Return the path of the single video of a folder.
+
+    Any container of ``VIDEO_EXTENSIONS`` is accepted, so AVI acquisitions
+    can be read directly. When the same video is present in several
+    containers, the first one of ``VIDEO_EXTENSIONS`` is used.
+
+    Args:
+        folder (str): Folder that should contain exactly one video.
+
+    Returns:
+        str: Path to the video, or None if there is no video or several of them.
+    """
+    video_files = [
+        f
+        for f in os.listdir(folder)
+        if os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS
+    ]
+    if len({os.path.splitext(f)[0] for f in video_files}) != 1:
+        return None
+    video_file = min(
+        video_files,
+        key=lambda f: VIDEO_EXTENSIONS.index(os.path.splitext(f)[1].lower()),
+    )
+    return os.path.join(folder, video_file)
+
+
+def video_info(video_path):
+    """Width, height, frame count and frame rate of a video, read from its header."""
+    capture = cv2.VideoCapture(video_path)
+    info = (
+        int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        int(capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+        capture.get(cv2.CAP_PROP_FPS),
+    )
+    capture.release()
+    return info
+
+
+def output_size(width, height, roi=None, scale=1.0):
+    """Size of the decoded frames, after cropping to ``roi`` and scaling by ``scale``."""
+    if roi is not None:
+        width, height = roi[2], roi[3]
+    return int(width * scale), int(height * scale)
+
+
+def _transform(frame, roi, scale):
+    if roi is not None:
+        x, y, w, h = roi
+        frame = frame[y : y + h, x : x + w]
+    if scale != 1:
+        return cv2.resize(frame, output_size(frame.shape[1], frame.shape[0], None, scale))
+    return np.ascontiguousarray(frame)
+
+
+def _decode_opencv(video_path, stride, roi, scale):
+    capture = cv2.VideoCapture(video_path)
+    try:
+        count = 0
+        while True:
+            # The skipped frames are grabbed without being converted
+            if count % stride:
+                if not capture.grab():
+                    break
+            else:
+                success, frame = capture.read()
+                if not success:
+                    break
+                yield _transform(frame, roi, scale)
+            count += 1
+    finally:
+        capture.release()
+
+
+def _decode_ffmpeg(video_path, stride, roi, scale):
+    width, height, _, _ = video_info(video_path)
+    out_width, out_height = output_size(width, height, roi, scale)
+    filters = []
+    if stride > 1:
+        filters.append(f"select=not(mod(n\\,{stride}))")
+    if roi is not None:
+        x, y, w, h = roi
+        filters.append(f"crop={w}:{h}:{x}:{y}")
+    if (out_width, out_height) != output_size(width, height, roi):
+        filters.append(f"scale={out_width}:{out_height}:flags=area")
+    command = ["ffmpeg", "-loglevel", "error", "-i", video_path]
+    if filters:
+        command += ["-vf", ",".join(filters)]
+    command += ["-vsync", "0", "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        while True:
+            frame = np.empty((out_height, out_width, 3), dtype=np.uint8)
+            if process.stdout.readinto(memoryview(frame.reshape(-1))) != frame.size:
+                break
+            yield frame
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def decode_video(video_path, stride=1, roi=None, scale=1.0, backend="opencv"):
+    """Yield the frames of a video, skipping, cropping and downscaling them while decoding.
+
+    With the "opencv" backend, the skipped frames are only grabbed, and the
+    kept ones are cropped before being resized. With the "ffmpeg" backend,
+    ffmpeg selects, crops and scales the frames itself and pipes them as raw
+    BGR images, so the full frames never reach Python.
+
+    Args:
+        video_path (str): Path to the video.
+        stride (int): Keep one frame out of ``stride``.
+        roi (tuple, optional): ``(x, y, width, height)`` to crop, in pixels
+            of the original frames.
+        scale (float): Scale factor applied after cropping.
+        backend (str): "opencv" or "ffmpeg".
+
+    Yields:
+        numpy.ndarray: The BGR frames.
+    """
+    if backend not in DECODE_BACKENDS:
+        raise ValueError(f"Unknown decode backend: {backend}")
+    if stride < 1:
+        raise ValueError("stride must be at least 1.")
+    if backend == "ffmpeg":
+        return _decode_ffmpeg(video_path, stride, roi, scale)
+    return _decode_opencv(video_path, stride, roi, scale)
+
+
+class FrameSource:
+    """Streams the synchronized (red, green) frames of an input folder.
+
+    The red channel video is expected at the root of ``input_folder`` and the
+    green channel video in its ``vert`` subfolder, as for ``inputconfig``.
+    Frames are decoded by a background thread and handed over through a
+    bounded queue, so at most ``prefetch`` frame pairs are held in memory at
+    any time. The source can be iterated several times, each iteration
+    decoding the videos again from the start.
+
+    Frames are resized to half their size by default. A ``stride``, a
+    ``roi`` and another ``scale`` can be given for quick looks at large
+    videos, and are applied while decoding, see :func:`decode_video`. The
+    kept frames are numbered from 0.
+
+    Args:
+        input_folder (str): Path to the input folder.
+        prefetch (int): Maximal number of decoded frame pairs waiting to be consumed.
+        stride (int): Keep one frame out of ``stride``.
+        roi (tuple, optional): ``(x, y, width, height)`` to crop, in pixels
+            of the videos.
+        scale (float): Scale factor applied after cropping.
+        backend (str): "opencv" or "ffmpeg".
+    """
+
+    def __init__(
+        self,
+        input_folder,
+        prefetch=8,
+        stride=1,
+        roi=None,
+        scale=0.5,
+        backend="opencv",
+    ):
+        if backend not in DECODE_BACKENDS:
+            raise ValueError(f"Unknown decode backend: {backend}")
+        self.input_folder = input_folder
+        self.prefetch = max(1, prefetch)
+        self.stride = max(1, stride)
+        self.roi = tuple(roi) if roi is not None else None
+        self.scale = scale
+        self.backend = backend
+        self.video_path = find_video(input_folder)
+        self.video_path_v = find_video(os.path.join(input_folder, "vert"))
+        if self.video_path is None or self.video_path_v is None:
+            raise FileNotFoundError(
+                "Erreur: Aucun fichier vidéo ou plusieurs fichiers vidéo trouvés dans le dossier."
+            )
+
+    def __len__(self):
+        count = min(
+            video_info(path)[2] for path in (self.video_path, self.video_path_v)
+        )
+        return (count + self.stride - 1) // self.stride
+
+    def _frames(self, path):
+        return decode_video(path, self.stride, self.roi, self.scale, self.backend)
+
+    def _decode(self, output, stop):
+        frames = self._frames(self.video_path)
+        frames_v = self._frames(self.video_path_v)
+        try:
+            for count, (frame, frame_v) in enumerate(zip(frames, frames_v)):
+                if stop.is_set():
+                    break
+                self._put(output, stop, (count, frame, frame_v))
+        except Exception as error:
+            self._put(output, stop, error)
+        finally:
+            frames.close()
+            frames_v.close()
+            self._put(output, stop, None)
+
+    @staticmethod
+    def _put(output, stop, item):
+        while not stop.is_set():
+            try:
+                output.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        """Yield ``(index, frame, frame_v)`` tuples in frame order."""
+        output = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._decode, args=(output, stop), daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = output.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
@@ -0,0 +1,58 @@
+import hashlib
+import cv2
+
+
+class TrackStyle:
+    """Colour and label of each track, the same in every run and every process.
+
+    The colour of a track is derived from a hash of its id, and not from a
+    random generator, so that two renders of the same tracks (or two
+    workers drawing different frames) agree. Colours are computed once per
+    track and kept in :attr:`colors`. The result videos and the per-track
+    curves of the analyse reports share these colours.
+
+    Args:
+        salt (str): Changes every colour, to get another palette.
+        thickness (int): Thickness of the contours and the labels.
+        font_scale (float): Scale of the labels.
+    """
+
+    def __init__(self, salt="", thickness=2, font_scale=2):
+        self.salt = salt
+        self.thickness = thickness
+        self.font_scale = font_scale
+        self.colors = {}
+
+    def color(self, track_id):
+        """BGR colour of a track."""
+        if track_id not in self.colors:
+            digest = hashlib.blake2b(
+                f"{self.salt}{track_id}".encode(), digest_size=3
+            ).digest()
+            self.colors[track_id] = tuple(int(c) for c in digest)
+        return self.colors[track_id]
+
+    def plot_color(self, track):
+        """RGB colour of a track in [0, 1], for matplotlib.
+
+        Args:
+            track (int or str): Track id, or its 'macrophage_<id>' name in the reports.
+        """
+        if isinstance(track, str):
+            track = int(track.rsplit("_", 1)[-1])
+        b, g, r = self.color(track)
+        return (r / 255, g / 255, b / 255)
+
+    def draw(self, image, track_id, contours, anchor):
+        """Draw the contours of an object of a track and its id at ``anchor``, in place."""
+        color = self.color(track_id)
+        cv2.drawContours(image, contours, -1, color, self.thickness)
+        cv2.putText(
+            image,
+            str(track_id),
+            anchor,
+            cv2.FONT_HERSHEY_SIMPLEX,
+            self.font_scale,
+            color,
+            self.thickness,
+        )
@@ -7,10 +7,10 @@ import sys
 from roifile import ImagejRoi
 import zipfile
 import shutil
-import inspect
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from locate.locate import locate_frame
+from pipeline.context import run_context
 
 
 def visualize_roi(image_path, roi_path, output_folder, color="red"):
@@ -178,7 +178,7 @@ def save_rois_to_folder(rois, folder_path, frame_name):
                 os.remove(roi_path)
 
 
-def comp_model_frame(frame, model_path, roi_frame):
+def comp_model_frame(frame, model_path, roi_frame, context=None):
     """
     Create an image comparison between the model's predictions and the ground truth.
 
@@ -199,6 +199,8 @@ def comp_model_frame(frame, model_path, roi_frame):
     roi_frame : str
         Path to the ground truth ROI frame. This must be a .zip file containing the
         ROIs or a .roi file.
+    context : RunContext, optional
+        Output root and scratch folder of the run. Defaults to './output'.
 
     Returns
     -------
@@ -214,14 +216,12 @@ def comp_model_frame(frame, model_path, roi_frame):
     - Ensure that the input paths are valid and the required files are present in
       the specified directories.
     """
-    # Get the directory in which this function will be used
-    called_path = os.path.dirname(os.path.abspath(inspect.stack()[-1].filename))
-    print(called_path)
+    context = run_context(context)
     # Define the output directory
-    output_dir = os.path.join(called_path, "model_output")
+    output_dir = context.path("model_output")
     print(output_dir)
     # Locate objects in the frame using the model
-    loc = locate_frame(frame, model_path, "model_output")
+    loc = locate_frame(frame, model_path, "model_output", context)
     # Convert model predictions to ROIs
     rois_pred = pred_to_rois(loc, min_length=1)
     # Define the folder to save predicted ROIs
@@ -276,14 +276,14 @@ def comp_model_frame(frame, model_path, roi_frame):
     shutil.rmtree(os.path.join(output_dir, "list_comp"))
     shutil.rmtree(os.path.join(output_dir, "ROIs_pred"))
     shutil.rmtree(os.path.join(output_dir, "viz_temp"))
-    shutil.rmtree(os.path.join(called_path, "temp_dataset"))
+    shutil.rmtree(context.scratch("temp_dataset"))
     shutil.rmtree(os.path.join(output_dir, "list_sep"))
     shutil.rmtree(os.path.join(output_dir, "masks_frame"))
 
 
-def comp_model(model_path, train=False):
+def comp_model(model_path, train=False, context=None):
     """
-    comp_model(model_path, train=False)
+    comp_model(model_path, train=False, context=None)
     Compare the model predictions with the ground truth.
 
     This function takes a test or training dataset and a model path, then compares
@@ -297,6 +297,9 @@ def comp_model(model_path, train=False):
     train : bool, optional
         If True, the training dataset is used for comparison. If False, the test
         dataset is used. Default is False.
+    context : RunContext, optional
+        Output root of the run, where the 'model_output' folder is created.
+        Defaults to './output'.
 
     Raises
     ------
@@ -320,7 +323,7 @@ def comp_model(model_path, train=False):
         set = "train"
     else:
         set = "test"
-    caller_path = os.path.dirname(os.path.abspath(inspect.stack()[1].filename))
+    context = run_context(context)
     # Test set folder
     test_set_folder = sorted(
         os.listdir(os.path.join(model_path, "dataset", f"{set}", f"{set}_x"))
@@ -332,7 +335,7 @@ def comp_model(model_path, train=False):
     )
     print(gt_folder)
     # Output folder
-    output_dir = os.path.join(caller_path, "model_output")
+    output_dir = context.path("model_output")
     # Clean it if it already exists
     if os.path.exists(output_dir):
         shutil.rmtree(output_dir)
@@ -346,4 +349,4 @@ def comp_model(model_path, train=False):
         img_path = os.path.join(model_path, "dataset", f"{set}", f"{set}_x", img)
         roi_path = os.path.join(model_path, "dataset", f"{set}", f"{set}_y", roi)
         # Compare the model with the ground truth
-        comp_model_frame(img_path, model_path, roi_path)
+        comp_model_frame(img_path, model_path, roi_path, context)
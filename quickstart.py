@@ -244,7 +244,7 @@ comp_model("./examples/input_model", train=True)
 from mactrack.visualisation.iou import mean_global_iou
 
 mean_global_iou(
-    "./model_output/test_def/ROIs_pred_def/",
+    "./output/model_output/test_def/ROIs_pred_def/",
     "./examples/input_model/dataset/train/train_y/",
-    "./model_output/comparison/",
+    "./output/model_output/comparison/",
 )
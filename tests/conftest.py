@@ -0,0 +1,15 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+# The mactrack modules import each other from the package folder
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../mactrack")))
+
+
+def disk(center, radius, shape):
+    """uint8 mask of a filled disk, 255 on the disk."""
+    image = np.zeros(shape, dtype=np.uint8)
+    cv2.circle(image, center, radius, 255, -1)
+    return image
@@ -0,0 +1,44 @@
+from conftest import disk
+from locate.objects import ObjectStore
+from track.assign import assign_tracks
+
+
+def _store(positions):
+    """One disk per (frame, object) at the given centers, None for a missed object."""
+    store = ObjectStore()
+    for frame, centers in enumerate(positions):
+        store.add_frame_objects(frame)
+        for obj, center in enumerate(centers):
+            if center is not None:
+                store.add(frame, obj, disk(center, 8, (60, 100)))
+    return store
+
+
+def test_assign_tracks_follows_moving_objects():
+    positions = [[(20 + 2 * f, 20), (70 - 2 * f, 40)] for f in range(5)]
+    table = assign_tracks(5, _store(positions))
+    assert len(table) == 2
+    assert table.tracks[1] == [(f, 0) for f in range(5)]
+    assert table.tracks[2] == [(f, 1) for f in range(5)]
+
+
+def test_assign_tracks_closes_gaps():
+    positions = [[(20 + 2 * f, 20), (70, 40)] for f in range(5)]
+    positions[2][0] = None  # the first object is missed in frame 2
+    table = assign_tracks(5, _store(positions), window=3)
+    assert len(table) == 2
+    assert table.tracks[1] == [(0, 0), (1, 0), (3, 0), (4, 0)]
+
+
+def test_assign_tracks_gap_longer_than_window_starts_a_new_track():
+    positions = [[(20, 20)], [None], [None], [(20, 20)]]
+    table = assign_tracks(4, _store(positions), window=2)
+    assert table.tracks == {1: [(0, 0)], 2: [(3, 0)]}
+
+
+def test_assign_tracks_is_one_to_one():
+    # Two objects close to the same track: only one of them continues it
+    positions = [[(30, 30)], [(28, 30), (34, 30)]]
+    table = assign_tracks(2, _store(positions))
+    continued = [members for members in table.tracks.values() if len(members) == 2]
+    assert len(continued) == 1 and len(table) == 2
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from video.background import GreenBackground
+
+
+def _green_frames(count, shape=(7, 9), seed=0):
+    rng = np.random.default_rng(seed)
+    frames = np.zeros((count,) + shape + (3,), dtype=np.uint8)
+    frames[:, :, :, 1] = rng.integers(0, 256, (count,) + shape)
+    return frames
+
+
+@pytest.mark.parametrize("count", [1, 2, 5, 10])
+def test_background_matches_numpy(count):
+    frames = _green_frames(count)
+    background = GreenBackground()
+    for frame in frames:
+        background.update(frame)
+
+    green = frames[:, :, :, 1]
+    assert np.array_equal(background.mean(), green.mean(axis=0).astype(np.uint8))
+    assert np.array_equal(
+        background.median(), np.median(green, axis=0).astype(np.uint8)
+    )
+    for q in (0, 10, 90, 100):
+        assert np.array_equal(
+            background.percentile_image(q),
+            np.percentile(green, q, axis=0).astype(np.uint8),
+        )
+
+
+def test_background_histogram_is_compact():
+    background = GreenBackground()
+    background.update(_green_frames(1)[0])
+    assert background._hist.shape == (256, 7 * 9)
+    assert background._hist.dtype == np.uint16
+
+
+def test_background_histogram_widens_before_overflow():
+    background = GreenBackground()
+    frame = _green_frames(1)[0]
+    background.update(frame)
+    background.count = np.iinfo(np.uint16).max
+    background._hist[frame[:, :, 1].ravel(), background._pixels] = background.count
+    background.update(frame)
+    assert background._hist.dtype == np.uint32
+    assert np.array_equal(background.median(), frame[:, :, 1])
+
+
+def test_background_without_frames():
+    with pytest.raises(ValueError):
+        GreenBackground().median()
+
+
+def test_inputconfig_writes_backgrounds_in_background_dir(tmp_path):
+    from video.inputconfig import inputconfig
+
+    frames = _green_frames(3)
+    source = [(count, frame, frame) for count, frame in enumerate(frames)]
+    background_dir = tmp_path / "output" / "background"
+
+    video_frames = inputconfig(
+        str(tmp_path),
+        write_frames=False,
+        source=source,
+        background_dir=str(background_dir),
+    )
+
+    assert len(video_frames) == 3
+    assert sorted(p.name for p in background_dir.iterdir()) == [
+        "mediane.png",
+        "moyenne.png",
+    ]
+    assert not (tmp_path / "vert").exists()
+
+
+def test_inputconfig_counts_the_frames_without_keeping_them(tmp_path):
+    from video.inputconfig import inputconfig
+
+    frames = _green_frames(4)
+    source = [(count, frame, frame) for count, frame in enumerate(frames)]
+
+    n = inputconfig(
+        str(tmp_path),
+        write_frames=False,
+        source=source,
+        background_dir=str(tmp_path / "background"),
+        keep_frames=False,
+    )
+
+    assert n == 4
+    assert (tmp_path / "background" / "mediane.png").exists()
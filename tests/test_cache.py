@@ -0,0 +1,61 @@
+import os
+
+from pipeline import cache
+from pipeline.cache import StageCache, file_hash, stage_key
+
+
+def _write(path, content):
+    with open(path, "w") as file:
+        file.write(content)
+    return str(path)
+
+
+def test_stage_key_depends_on_params_inputs_and_upstream(tmp_path):
+    video = _write(tmp_path / "video.mp4", "frames")
+    key = stage_key("track", {"threshold_iou": 0.5}, [video], ["abc"])
+    assert key == stage_key("track", {"threshold_iou": 0.5}, [video], ["abc"])
+    assert key != stage_key("track", {"threshold_iou": 0.6}, [video], ["abc"])
+    assert key != stage_key("track", {"threshold_iou": 0.5}, [video], ["abd"])
+    assert key != stage_key("filter", {"threshold_iou": 0.5}, [video], ["abc"])
+    _write(video, "other frames")
+    assert key != stage_key("track", {"threshold_iou": 0.5}, [video], ["abc"])
+
+
+def test_stage_key_ignores_input_paths(tmp_path):
+    a = _write(tmp_path / "a.mp4", "frames")
+    b = _write(tmp_path / "b.mp4", "frames")
+    assert stage_key("locate", inputs=[a]) == stage_key("locate", inputs=[b])
+
+
+def test_file_hash_is_memoized_by_size_and_mtime(tmp_path, monkeypatch):
+    video = _write(tmp_path / "video.mp4", "frames")
+    calls = []
+
+    def counting_hash(path, chunk_size=1 << 20):
+        calls.append(path)
+        return file_hash(path, chunk_size)
+
+    monkeypatch.setattr(cache, "file_hash", counting_hash)
+    store = StageCache(str(tmp_path / ".cache"))
+    digest = store.file_hash(video)
+    assert store.file_hash(video) == digest
+    # The index on disk is shared with a new cache object
+    assert StageCache(str(tmp_path / ".cache")).file_hash(video) == digest
+    assert len(calls) == 1
+
+    _write(video, "new frames")
+    os.utime(video, ns=(1, 1))
+    assert store.file_hash(video) == file_hash(video) != digest
+    assert len(calls) == 2
+
+
+def test_stage_cache_restores_value_and_outputs(tmp_path):
+    store = StageCache(str(tmp_path / ".cache"))
+    output = _write(tmp_path / "tracks.csv", "track,frame,object\n")
+    assert ("track", "k") not in store
+    store.store("track", "k", {"n": 3}, [output])
+    os.remove(output)
+    assert ("track", "k") in store
+    assert store.load("track", "k", [output]) == {"n": 3}
+    with open(output) as file:
+        assert file.read() == "track,frame,object\n"
@@ -0,0 +1,154 @@
+import cv2
+import numpy as np
+import pytest
+
+from conftest import disk
+from locate.defuse import (
+    extract_and_save_objects,
+    overlap_table,
+    trace_lines_between_contours,
+    watershed_split,
+)
+from locate.objects import ObjectStore
+from locate.list_sep import segmentation
+
+SHAPE = (100, 140)
+
+
+def _baseline_parts(image_c, image, min_object_size=100):
+    """Full-frame parts as the original per-contour implementation drew them."""
+    image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    contours, _ = cv2.findContours(
+        image_gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
+    parts = []
+    for contour in contours:
+        if cv2.contourArea(contour) < min_object_size:
+            continue
+        mask = np.zeros_like(image_gray)
+        cv2.drawContours(mask, [contour], -1, 255, thickness=cv2.FILLED)
+        parts.append(cv2.bitwise_and(image_c, image_c, mask=mask))
+    return parts
+
+
+def test_extract_and_save_objects_matches_filled_contours(tmp_path):
+    image_c = np.zeros((80, 120), dtype=np.uint8)
+    cv2.circle(image_c, (35, 40), 22, 255, -1)
+    cv2.circle(image_c, (75, 40), 22, 255, -1)
+    cv2.circle(image_c, (35, 40), 4, 0, -1)  # a hole, kept as a hole
+    cv2.rectangle(image_c, (100, 70), (104, 74), 255, -1)  # too small
+    image = cv2.merge([image_c] * 3)
+    cv2.line(image, (55, 0), (55, 79), (0, 0, 0), 2)  # the split line
+    cv2.line(image, (20, 40), (30, 40), (0, 0, 0), 1)  # a cut inside a part
+
+    storage = segmentation(str(tmp_path))
+    storage.add(0, 0, image_c)
+    extract_and_save_objects(image_c, image, 0, 0, storage)
+
+    expected = _baseline_parts(image_c, image)
+    found = [storage.dense(0, obj) for obj in sorted(storage.objects(0))]
+    assert len(found) == len(expected) == 2
+    for part, reference in zip(found, expected):
+        assert np.array_equal(part, reference)
+
+
+def test_overlap_table_counts_shared_pixels():
+    rng = np.random.default_rng(0)
+    labels_a = rng.integers(0, 4, (30, 40)).astype(np.int32)
+    labels_b = rng.integers(0, 3, (30, 40)).astype(np.int32)
+    table = overlap_table(labels_a, 3, labels_b, 2)
+    assert table.shape == (3, 2)
+    for r in range(3):
+        for c in range(2):
+            assert table[r, c] == np.sum((labels_a == r + 1) & (labels_b == c + 1))
+
+
+def test_overlap_table_without_objects():
+    labels = np.zeros((5, 5), dtype=np.int32)
+    assert overlap_table(labels, 0, labels, 2).shape == (0, 2)
+
+
+def _merged_store():
+    """Frame 0: two separate cells. Frame 1: the same cells merged into one object."""
+    store = ObjectStore()
+    store.add(0, 0, disk((45, 50), 28, SHAPE))
+    store.add(0, 1, disk((95, 50), 28, SHAPE))
+    store.add(
+        1, 0, cv2.bitwise_or(disk((47, 50), 30, SHAPE), disk((93, 50), 30, SHAPE))
+    )
+    return store
+
+
+def test_watershed_split_conserves_the_merged_object():
+    store = _merged_store()
+    merged = store.dense(1, 0) > 0
+    watershed_split(store, 1, 0, 0, [0, 1])
+
+    parts = [store.dense(1, obj) > 0 for obj in sorted(store.objects(1))]
+    assert len(parts) == 2
+    assert sum(part.sum() for part in parts) == merged.sum()
+    assert np.array_equal(np.logical_or.reduce(parts), merged)
+    assert not (parts[0] & parts[1]).any()
+    # Each part is grown from its own cell
+    assert parts[0][50, 30] and parts[1][50, 110]
+
+
+def test_watershed_split_merges_small_parts_into_their_neighbours():
+    store = ObjectStore()
+    store.add(0, 0, disk((50, 50), 28, SHAPE))
+    store.add(0, 1, disk((84, 50), 6, SHAPE))
+    store.add(
+        1, 0, cv2.bitwise_or(disk((50, 50), 30, SHAPE), disk((84, 50), 7, SHAPE))
+    )
+    merged = store.dense(1, 0) > 0
+    watershed_split(store, 1, 0, 0, [0, 1], min_object_size=200)
+
+    assert sorted(store.objects(1)) == [0]
+    assert np.array_equal(store.dense(1, 0) > 0, merged)
+
+
+def _baseline_lines(images, distance_threshold=50):
+    """Lines as the original pairwise loop over the contour points drew them."""
+    traced_lines_image = np.zeros_like(images[0])
+    all_contours = []
+    for image in images:
+        contours, _ = cv2.findContours(
+            image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        all_contours.extend(contours)
+    for i in range(len(all_contours)):
+        for j in range(i + 1, len(all_contours)):
+            for point1 in all_contours[i]:
+                for point2 in all_contours[j]:
+                    if np.linalg.norm(point1 - point2) < distance_threshold:
+                        cv2.line(
+                            traced_lines_image,
+                            tuple(point1[0]),
+                            tuple(point2[0]),
+                            (255),
+                            1,
+                        )
+    return traced_lines_image
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_trace_lines_between_contours_matches_the_pairwise_loop(seed):
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(rng.integers(1, 4)):
+        image = np.zeros((90, 120), dtype=np.uint8)
+        # Several shapes per mask, so a mask can have several contours
+        for _ in range(rng.integers(1, 4)):
+            center = tuple(int(v) for v in rng.integers((10, 10), (110, 80)))
+            if rng.random() < 0.5:
+                cv2.circle(image, center, int(rng.integers(3, 15)), 255, -1)
+            else:
+                corner = tuple(int(v) for v in center + rng.integers(3, 20, 2))
+                cv2.rectangle(image, center, corner, 255, -1)
+        images.append(image)
+    distance_threshold = float(rng.choice([10, 25, 50]))
+
+    assert np.array_equal(
+        trace_lines_between_contours(images, distance_threshold),
+        _baseline_lines(images, distance_threshold),
+    )
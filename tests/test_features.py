@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+import pandas as pd
+
+from analyse.features import FEATURE_COLUMNS, frame_ratios, ratio_stats, wide_table
+
+
+def _features(rows):
+    features = pd.DataFrame(
+        [row + [np.nan] * (len(FEATURE_COLUMNS) - len(row)) for row in rows],
+        columns=FEATURE_COLUMNS,
+    )
+    return features
+
+
+def test_wide_table_layout():
+    features = _features(
+        [
+            # track, frame, object, area
+            [2, 0, 1, 30.0],
+            [1, 0, 0, 10.0],
+            [1, 2, 0, 12.0],
+        ]
+    )
+    table = wide_table(features, "area", 3)
+    assert list(table.columns) == ["Time", "0", "1", "2"]
+    assert list(table["Time"]) == ["macrophage_1", "macrophage_2"]
+    assert table.loc[0, "0"] == 10.0 and table.loc[0, "2"] == 12.0
+    assert np.isnan(table.loc[0, "1"])
+    assert table.loc[1, "0"] == 30.0
+    assert table.loc[1, ["1", "2"]].isna().all()
+
+
+def test_wide_table_keeps_the_smallest_object_of_a_frame():
+    features = _features([[1, 0, 3, 40.0], [1, 0, 1, 20.0]])
+    table = wide_table(features, "area", 1)
+    assert table.loc[0, "0"] == 20.0
+
+
+def test_wide_table_ignores_frames_beyond_n():
+    features = _features([[1, 0, 0, 1.0], [1, 5, 0, 2.0]])
+    assert list(wide_table(features, "area", 2).columns) == ["Time", "0", "1"]
+
+
+def test_ratio_stats():
+    mask = np.array([[True, True], [True, False]])
+    green_a = np.array([[20.0, 30.0], [5.0, 99.0]])
+    green_f0 = np.array([[10.0, 10.0], [0.0, 1.0]])
+    stats = ratio_stats(mask, green_a, green_f0, q=50)
+    # Ratios 1 and 2 where F0 is set, divided by the 3 pixels of the mask
+    assert stats["mean"] == 1.0
+    assert stats["max"] == 2.0
+    assert stats["percentile"] == 1.5
+    assert stats["integrated"] == 55.0
+
+
+def test_ratio_stats_without_valid_pixels():
+    mask = np.ones((2, 2), dtype=bool)
+    stats = ratio_stats(mask, np.ones((2, 2)), np.zeros((2, 2)))
+    assert stats["mean"] == 0
+    assert np.isnan(stats["max"]) and np.isnan(stats["percentile"])
+    empty = ratio_stats(np.zeros((2, 2), dtype=bool), np.ones((2, 2)), np.ones((2, 2)))
+    assert empty["mean"] == 0 and empty["integrated"] == 0
+
+
+def test_frame_ratios_matches_full_frame_masks():
+    rng = np.random.default_rng(0)
+    image_a = rng.integers(0, 256, (50, 60, 3), dtype=np.uint8)
+    image_f0 = rng.integers(0, 256, (50, 60, 3), dtype=np.uint8)
+    objects = []
+    for center in ((15, 15), (40, 30)):
+        mask = np.zeros((50, 60), dtype=np.uint8)
+        cv2.circle(mask, center, 9, 255, -1)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        objects.append((contours, mask == 255))
+
+    stats = frame_ratios([contours for contours, _ in objects], image_a, image_f0)
+    for (_, mask), found in zip(objects, stats):
+        expected = ratio_stats(
+            mask,
+            image_a[:, :, 1].astype(np.float64),
+            image_f0[:, :, 1].astype(np.float64),
+        )
+        for key, value in expected.items():
+            assert np.isclose(found[key], value)
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+import pytest
+
+from locate.labels import label_objects
+
+
+def _filter_small_shapes(image, min_size):
+    # filter_small_shapes of locate before the objects were labelled
+    contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < min_size:
+            cv2.drawContours(image, [contour], 0, 0, -1)
+    return image
+
+
+def _blobs(seed, shape=(120, 160)):
+    rng = np.random.default_rng(seed)
+    noise = cv2.GaussianBlur(rng.random(shape), (0, 0), rng.uniform(1, 4))
+    return 255 * (noise > np.percentile(noise, rng.uniform(60, 90))).astype(np.uint8)
+
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("min_size", [0, 10, 100])
+def test_label_objects_keeps_the_shapes_of_filter_small_shapes(seed, min_size):
+    image = _blobs(seed)
+    expected = _filter_small_shapes(image.copy(), min_size)
+
+    frame_labels = label_objects(image, min_size)
+
+    assert np.array_equal(frame_labels.binary(), expected)
+    assert frame_labels.areas.sum() == np.count_nonzero(expected)
+
+
+def test_label_objects_measures_by_contour_area():
+    image = np.zeros((20, 40), dtype=np.uint8)
+    image[2:12, 2:12] = 255  # contour area 81, 100 pixels
+    image[2:3, 20:35] = 255  # a line: 15 pixels, no area
+
+    frame_labels = label_objects(image, 50)
+    assert len(frame_labels) == 1
+    assert frame_labels.areas.tolist() == [100]
+    assert len(label_objects(image, 90)) == 0
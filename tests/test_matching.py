@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from track.matching import candidate_pairs, crop_iou
+
+
+def _random_bboxes(rng, count, size=100):
+    return np.column_stack(
+        [
+            rng.integers(0, size, (count, 2)),
+            rng.integers(1, 25, (count, 2)),
+        ]
+    )
+
+
+def _overlapping_pairs(bboxes_a, bboxes_b):
+    pairs = set()
+    for i, (xa, ya, wa, ha) in enumerate(bboxes_a):
+        for j, (xb, yb, wb, hb) in enumerate(bboxes_b):
+            if xa < xb + wb and xb < xa + wa and ya < yb + hb and yb < ya + ha:
+                pairs.add((i, j))
+    return pairs
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_candidate_pairs_matches_all_pairs(seed):
+    rng = np.random.default_rng(seed)
+    bboxes_a = _random_bboxes(rng, rng.integers(0, 30))
+    bboxes_b = _random_bboxes(rng, rng.integers(0, 30))
+
+    rows, cols = candidate_pairs(bboxes_a, bboxes_b)
+
+    assert len(rows) == len(set(zip(rows, cols)))
+    assert set(zip(rows.tolist(), cols.tolist())) == _overlapping_pairs(
+        bboxes_a, bboxes_b
+    )
+
+
+def test_candidate_pairs_ignores_touching_boxes():
+    rows, cols = candidate_pairs([[0, 0, 10, 10]], [[10, 0, 5, 5], [0, 10, 5, 5]])
+    assert len(rows) == len(cols) == 0
+
+
+def _frame_mask(bbox, mask, shape=(60, 60)):
+    x, y, w, h = bbox
+    frame = np.zeros(shape, dtype=bool)
+    frame[y : y + h, x : x + w] = mask
+    return frame
+
+
+def _full_frame_iou(bbox_a, mask_a, bbox_b, mask_b):
+    frame_a, frame_b = _frame_mask(bbox_a, mask_a), _frame_mask(bbox_b, mask_b)
+    union = np.logical_or(frame_a, frame_b).sum()
+    return np.logical_and(frame_a, frame_b).sum() / union if union else 0
+
+
+@pytest.mark.parametrize(
+    "bbox_b",
+    [
+        (12, 15, 14, 10),  # overlapping
+        (10, 10, 8, 6),  # same corner
+        (30, 40, 8, 6),  # apart
+        (20, 10, 8, 6),  # touching the right edge of a
+        (10, 22, 8, 6),  # touching the bottom edge of a
+    ],
+)
+def test_crop_iou_matches_full_frame_iou(bbox_b):
+    rng = np.random.default_rng(0)
+    bbox_a = (10, 10, 10, 12)
+    mask_a = rng.random((bbox_a[3], bbox_a[2])) < 0.7
+    mask_b = rng.random((bbox_b[3], bbox_b[2])) < 0.7
+
+    assert np.isclose(
+        crop_iou(bbox_a, mask_a, bbox_b, mask_b),
+        _full_frame_iou(bbox_a, mask_a, bbox_b, mask_b),
+    )
+
+
+def test_crop_iou_of_empty_masks():
+    empty = np.zeros((3, 3), dtype=bool)
+    assert crop_iou((0, 0, 3, 3), empty, (1, 1, 3, 3), empty) == 0
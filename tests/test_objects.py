@@ -0,0 +1,18 @@
+import cv2
+import numpy as np
+
+from locate.objects import ObjectStore, object_contours, stored_contours
+
+
+def test_stored_contours_match_the_full_frame_mask():
+    mask = np.zeros((40, 50), dtype=np.uint8)
+    cv2.rectangle(mask, (10, 5), (30, 20), 255, -1)
+    cv2.circle(mask, (30, 25), 8, 255, -1)
+    store = ObjectStore()
+    store.add(0, 0, mask)
+
+    found = np.zeros_like(mask)
+    cv2.drawContours(found, stored_contours(store, 0, 0), -1, 255, cv2.FILLED)
+    expected = np.zeros_like(mask)
+    cv2.drawContours(expected, object_contours(mask), -1, 255, cv2.FILLED)
+    assert np.array_equal(found, expected)
@@ -0,0 +1,14 @@
+from visualisation.style import TrackStyle
+
+
+def test_track_colours_are_deterministic():
+    assert TrackStyle().color(3) == TrackStyle().color(3)
+    assert TrackStyle().color(3) != TrackStyle(salt="other").color(3)
+
+
+def test_plot_colour_matches_the_video_colour():
+    style = TrackStyle()
+    b, g, r = style.color(7)
+    expected = (r / 255, g / 255, b / 255)
+    assert style.plot_color(7) == expected
+    assert style.plot_color("macrophage_7") == expected
@@ -0,0 +1,59 @@
+from track.table import TrackTable
+
+
+def _table():
+    table = TrackTable()
+    first = table.new_track(0, 0)
+    table.append(first, 1, 0)
+    table.append(first, 2, 1)
+    second = table.new_track(0, 1)
+    table.append(second, 1, 1)
+    third = table.new_track(2, 0)
+    # An object shared by two tracks
+    table.append(third, 1, 1)
+    return table
+
+
+def test_save_load_round_trip(tmp_path):
+    table = _table()
+    path = tmp_path / "data" / "tracks.csv"
+    table.save(str(path))
+
+    loaded = TrackTable.load(str(path))
+
+    assert loaded.tracks == table.tracks
+    assert loaded.index == table.index
+    assert loaded.new_track(3, 0) == table.new_track(3, 0)
+
+
+def test_load_of_an_empty_table(tmp_path):
+    path = tmp_path / "tracks.csv"
+    TrackTable().save(str(path))
+
+    loaded = TrackTable.load(str(path))
+
+    assert len(loaded) == 0
+    assert loaded.new_track(0, 0) == 1
+
+
+def test_remove_short():
+    table = _table()
+
+    table.remove_short(2)
+
+    assert list(table) == [1]
+    assert table.tracks[1] == [(0, 0), (1, 0), (2, 1)]
+    assert table.track_of(0, 1) is None
+    assert table.track_of(1, 1) is None
+    assert table.track_of(2, 1) == 1
+
+
+def test_remove_short_reindexes_shared_objects():
+    table = _table()
+    table.append(3, 3, 0)
+    assert table.track_of(1, 1) == 2
+
+    table.remove_short(2)
+
+    assert list(table) == [1, 3]
+    assert table.track_of(1, 1) == 3